@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+Libreria del generatore di grafici del livello dell'acqua.
+
+Esempio di uso nello stesso processo, senza effetti collaterali globali:
+
+    from acqua import load_settings, SiteGenerator, GitPublisher
+
+    settings = load_settings('config.ini')
+    generator = SiteGenerator(settings)
+    html_files = generator.generate()
+    GitPublisher(settings).publish(html_files)
+
+readFileAndGraph_v3_plotly.py e' l'interfaccia a riga di comando su questa libreria.
+Fanno parte del pacchetto anche l'archivio SQLite (acqua.measurements_db),
+la compattazione dei log nell'archivio zip (acqua.measurements_archive) e i
+nomi dei mesi (acqua.mese).
+"""
+
+from . import measurements_archive, measurements_db
+from .dashboard import DashboardRenderer
+from .parser import LogParser, load_client_name_map
+from .publisher import GitPublisher
+from .renderer import PlotlyRenderer
+from .settings import ConfigError, Settings, load_settings
+from .site import SiteGenerator
+
+__all__ = [
+    "ConfigError",
+    "DashboardRenderer",
+    "GitPublisher",
+    "LogParser",
+    "PlotlyRenderer",
+    "Settings",
+    "SiteGenerator",
+    "load_client_name_map",
+    "load_settings",
+]
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Cruscotto con tutti i client su un unico asse temporale.
+
+Le misurazioni vengono esportate in un file JSON per mese
+(<dati>/YYYY-MM.json) piu' un elenco dei mesi disponibili (<dati>/mesi.json).
+La pagina usa tracce WebGL (scattergl), parte dal mese piu' recente e
+scarica gli altri mesi solo quando l'utente allarga lo zoom fino a
+includerli, per cui resta reattiva anche con anni di storico.
+"""
+
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "mesi.json"
+PLOTLY_JS_URL = "https://cdn.plot.ly/plotly-3.0.1.min.js"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M"
+
+_PAGE_TEMPLATE = """<html><head>
+    <meta charset="utf-8" />
+    <meta name="viewport" content="width=device-width, initial-scale=1.0" />
+    <title>Cruscotto Livello acqua</title>
+    <script charset="utf-8" src="__PLOTLY_JS_URL__"></script>
+    <style>#grafico { width: 100%; height: 75vh; }</style>
+</head>
+<body><h1>Cruscotto Livello acqua - tutti i client</h1>
+<p id="stato">Caricamento dati...</p>
+<div id="grafico"></div>
+<ul><li><a href="__INDEX_LINK__">Grafici Mese Corrente</a></li></ul>
+<script type="text/javascript">
+const DATA_DIR = "__DATA_DIR__";
+const graphDiv = document.getElementById("grafico");
+const statusLine = document.getElementById("stato");
+const loadedMonths = new Set();  // mesi "YYYY-MM" gia' uniti alle serie
+const monthLoads = {};   // "YYYY-MM" -> Promise del caricamento
+const traceX = {}, traceY = {};  // client -> punti dei mesi caricati, in ordine cronologico
+let months = [];         // mesi disponibili in ordine crescente
+let clients = [];
+
+// Plotly restituisce gli estremi dell'asse come "YYYY-MM-DD HH:MM:SS.sss" (non ISO-8601, Date non e' affidabile)
+function monthKey(rangeValue) {
+    return String(rangeValue).slice(0, 7);
+}
+
+// In caso di errore il caricamento non resta in cache: verra' ritentato al prossimo zoom
+function loadMonth(month) {
+    if (!monthLoads[month]) {
+        monthLoads[month] = fetch(DATA_DIR + "/" + month + ".json", {cache: "no-cache"})
+            .then(response => {
+                if (!response.ok) { throw new Error("HTTP " + response.status); }
+                return response.json();
+            })
+            .then(data => { mergeMonth(data); loadedMonths.add(month); })
+            .catch(error => {
+                delete monthLoads[month];
+                throw new Error("mese " + month + ": " + error.message);
+            });
+    }
+    return monthLoads[month];
+}
+
+// Unisce un mese alle serie dei client una sola volta, all'arrivo. I mesi non si sovrappongono
+// e gli orari "YYYY-MM-DD HH:MM" si ordinano come stringhe: basta cercare il punto di inserimento
+// (di solito in testa, perche' i mesi vengono caricati dal piu' recente)
+function mergeMonth(data) {
+    for (const [client, series] of Object.entries(data.clients)) {
+        if (!series.x.length) { continue; }
+        const x = traceX[client] || [], y = traceY[client] || [];
+        let low = 0, high = x.length;
+        while (low < high) {
+            const mid = (low + high) >> 1;
+            if (x[mid] < series.x[0]) { low = mid + 1; } else { high = mid; }
+        }
+        traceX[client] = low === x.length ? x.concat(series.x) : x.slice(0, low).concat(series.x, x.slice(low));
+        traceY[client] = low === y.length ? y.concat(series.y) : y.slice(0, low).concat(series.y, y.slice(low));
+    }
+}
+
+function buildTraces() {
+    return clients.map(client => ({
+        type: "scattergl", mode: "lines+markers", name: client, x: traceX[client] || [], y: traceY[client] || [],
+        marker: {size: 4}, hovertemplate: "%{x|%d/%m/%Y %H:%M}<br>%{y:.1f} cm<extra>" + client + "</extra>"}));
+}
+
+function redraw() {
+    const layout = {
+        uirevision: "cruscotto",  // mantiene zoom e legenda quando arrivano nuovi mesi
+        xaxis: {type: "date", title: {text: "Data"},
+                rangeselector: {buttons: [
+                    {count: 7, label: "7g", step: "day", stepmode: "backward"},
+                    {count: 1, label: "1m", step: "month", stepmode: "backward"},
+                    {count: 6, label: "6m", step: "month", stepmode: "backward"},
+                    {count: 1, label: "1a", step: "year", stepmode: "backward"},
+                    {label: "Tutto", step: "all"}]}},
+        yaxis: {title: {text: "Altezza acqua (cm)"}, range: [0, 400]},
+        legend: {orientation: "h"},
+        margin: {t: 40}
+    };
+    return Plotly.react(graphDiv, buildTraces(), layout, {responsive: true});
+}
+
+function updateStatus() {
+    const loadedCount = loadedMonths.size;
+    statusLine.textContent = "Mesi caricati: " + loadedCount + " di " + months.length +
+        (loadedCount < months.length ? " (allargare lo zoom per caricare i mesi precedenti)" : "");
+}
+
+// Carica, dal piu' recente, i mesi che cadono nell'intervallo visibile e non sono ancora presenti
+async function ensureMonthsLoaded(start, end) {
+    const wanted = months.filter(month => (start === null || month >= start) && (end === null || month <= end) && !loadedMonths.has(month));
+    try {
+        for (const month of wanted.reverse()) {
+            statusLine.textContent = "Caricamento " + month + "...";
+            await loadMonth(month);
+            await redraw();
+        }
+        updateStatus();
+    } catch (error) {
+        statusLine.textContent = "Errore durante il caricamento dei dati (" + error.message + "). Riprovare cambiando lo zoom.";
+    }
+}
+
+fetch(DATA_DIR + "/__MANIFEST__", {cache: "no-cache"})
+    .then(response => response.json())
+    .then(async manifest => {
+        months = Object.keys(manifest.months).sort();
+        clients = [...new Set(months.flatMap(month => manifest.months[month].clients))].sort();
+        if (!months.length) { statusLine.textContent = "Nessun dato disponibile."; return; }
+        await loadMonth(months[months.length - 1]);
+        await redraw();
+        updateStatus();
+        graphDiv.on("plotly_relayout", event => {
+            if (event["xaxis.autorange"]) {  // doppio clic o pulsante "Tutto"
+                ensureMonthsLoaded(null, null);
+            } else if (event["xaxis.range[0]"] !== undefined || event["xaxis.range"]) {
+                const range = event["xaxis.range"] || [event["xaxis.range[0]"], event["xaxis.range[1]"]];
+                ensureMonthsLoaded(monthKey(range[0]), monthKey(range[1]));
+            }
+        });
+    })
+    .catch(error => { statusLine.textContent = "Errore durante il caricamento dei dati: " + error.message; });
+</script>
+</body></html>
+"""
+
+
+def _write_if_changed(path, content):
+    """Scrive il file solo se il contenuto e' diverso (evita commit inutili). Restituisce True se scritto."""
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return False
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return True
+
+
+class DashboardRenderer:
+    """Scrive la pagina del cruscotto e i file JSON mensili nelle directory indicate da Settings."""
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    def ensure_data_directory(self):
+        """Crea la directory dei dati del cruscotto. Restituisce False se non e' possibile."""
+        data_dir = self.settings.dashboard_data_dir_path
+        if os.path.isdir(data_dir):
+            return True
+        try:
+            os.makedirs(data_dir)
+            logger.info(f"Directory dei dati del cruscotto creata: {data_dir}")
+            return True
+        except OSError as e:
+            logger.error(f"Impossibile creare la directory dei dati del cruscotto {data_dir}: {e}")
+            return False
+
+    def month_data_path(self, year, month):
+        return os.path.join(self.settings.dashboard_data_dir_path, f"{year:04d}-{month:02d}.json")
+
+    def manifest_path(self):
+        return os.path.join(self.settings.dashboard_data_dir_path, MANIFEST_FILENAME)
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path(), 'r', encoding='utf-8') as f:
+                return json.load(f).get("months", {})
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Elenco dei mesi del cruscotto '{self.manifest_path()}' illeggibile: {e}. Verrà ricreato.")
+            return {}
+
+    def save_month(self, year, month, readings_by_client):
+        """
+        Esporta le misurazioni di un mese ({client: {"times": [...], "values": [...]}}).
+        Restituisce (percorso se il file e' cambiato altrimenti None, voce per l'elenco dei mesi);
+        se il file non puo' essere scritto restituisce (None, None) e il mese va saltato.
+        """
+        month_json = {
+            "month": f"{year:04d}-{month:02d}",
+            "clients": {client_id: {"x": [t.strftime(TIMESTAMP_FORMAT) for t in series["times"]], "y": series["values"]}
+                        for client_id, series in sorted(readings_by_client.items())},
+        }
+        manifest_entry = {
+            "clients": sorted(readings_by_client),
+            "points": sum(len(series["values"]) for series in readings_by_client.values()),
+        }
+        path = self.month_data_path(year, month)
+        try:
+            written = _write_if_changed(path, json.dumps(month_json, separators=(',', ':')))
+        except OSError as e:
+            logger.error(f"Impossibile scrivere i dati del cruscotto per {year:04d}-{month:02d} in '{path}': {e}")
+            return None, None
+        if written:
+            logger.info(f"Dati del cruscotto per {year:04d}-{month:02d} salvati in '{path}' ({manifest_entry['points']} punti).")
+        return (path if written else None), manifest_entry
+
+    def save_manifest(self, months):
+        """Scrive l'elenco dei mesi disponibili. Restituisce il percorso se il file e' cambiato, altrimenti None."""
+        path = self.manifest_path()
+        content = json.dumps({"months": dict(sorted(months.items()))}, indent=1)
+        try:
+            return path if _write_if_changed(path, content) else None
+        except OSError as e:
+            logger.error(f"Impossibile scrivere l'elenco dei mesi del cruscotto '{path}': {e}")
+            return None
+
+    def save_page(self):
+        """
+        Scrive dashboard.html. La pagina non contiene dati (li legge dai file JSON), per cui
+        viene riscritta solo se cambia la configurazione. Restituisce il percorso se il file
+        e' cambiato, altrimenti None.
+        """
+        settings = self.settings
+        page_dir = os.path.dirname(settings.dashboard_path)
+        html_content = (_PAGE_TEMPLATE
+                        .replace("__PLOTLY_JS_URL__", PLOTLY_JS_URL)
+                        .replace("__DATA_DIR__", os.path.relpath(settings.dashboard_data_dir_path, page_dir).replace(os.sep, "/"))
+                        .replace("__MANIFEST__", MANIFEST_FILENAME)
+                        .replace("__INDEX_LINK__", os.path.relpath(settings.html_output_path, page_dir).replace(os.sep, "/")))
+        try:
+            if _write_if_changed(settings.dashboard_path, html_content):
+                logger.info(f"Cruscotto HTML salvato in '{settings.dashboard_path}'")
+                return settings.dashboard_path
+        except OSError as e:
+            logger.error(f"Impossibile scrivere il cruscotto HTML '{settings.dashboard_path}': {e}")
+        return None
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compattazione dei log mensili chiusi nell'archivio compresso measurements_arch.zip.
+
+Dopo il cambio di mese i file 'measurements.log.YYYY-MM' dei mesi chiusi
+vengono aggiunti all'archivio zip. L'archivio viene riscritto in un file
+temporaneo, verificato (CRC zip e SHA-256 di ogni membro) e solo allora
+sostituito atomicamente all'originale; i file sciolti vengono rimossi per
+ultimi. Accanto all'archivio viene scritto un indice JSON
+(measurements_arch.index.json) con, per ogni membro: mese, client, numero
+di righe, timestamp minimo e massimo, SHA-256. I lettori possono cosi'
+individuare i mesi e i client che servono senza aprire ogni membro.
+L'indice registra anche dimensione dell'archivio e CRC dei membri, per
+riconoscere un archivio modificato a mano.
+
+Uso da riga di comando:
+    python3 measurements_archive.py <directory_log> [archivio.zip]
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+import zipfile
+
+from . import measurements_db
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 2
+MONTHLY_LOG_NAME_RE = re.compile(r"^measurements\.log\.(\d{4})-(\d{2})$")
+
+
+class ArchiveVerificationError(Exception):
+    """L'archivio riscritto non corrisponde ai dati attesi."""
+    pass
+
+
+def index_path_for(zip_path):
+    """Percorso dell'indice associato a un archivio ('x.zip' -> 'x.index.json')."""
+    return os.path.splitext(zip_path)[0] + ".index.json"
+
+
+def build_member_index(member_name, content):
+    """Calcola la voce di indice di un membro a partire dal suo contenuto (bytes)."""
+    match = MONTHLY_LOG_NAME_RE.match(os.path.basename(member_name))
+    clients = set()
+    line_count = 0
+    min_ts = max_ts = None
+    for rec in content.decode('utf-8', errors='replace').splitlines():
+        row = measurements_db.parse_measurement_line(rec.strip())
+        if row is None:
+            continue
+        client, ts, _ = row
+        clients.add(client)
+        line_count += 1
+        min_ts = ts if min_ts is None or ts < min_ts else min_ts
+        max_ts = ts if max_ts is None or ts > max_ts else max_ts
+    return {
+        "month": f"{match.group(1)}-{match.group(2)}" if match else None,
+        "clients": sorted(clients),
+        "lines": line_count,
+        "min_ts": min_ts,
+        "max_ts": max_ts,
+        "sha256": hashlib.sha256(content).hexdigest(),
+    }
+
+
+def _member_crcs(zip_path):
+    """CRC di ogni membro, letti dalla directory centrale dello zip (senza decomprimere)."""
+    with zipfile.ZipFile(zip_path) as zf:
+        return {info.filename: info.CRC for info in zf.infolist()}
+
+
+def _index_matches_archive(index, zip_path):
+    if index.get("version") != INDEX_VERSION or index.get("archive_size") != os.path.getsize(zip_path):
+        return False
+    try:
+        return index.get("member_crcs") == _member_crcs(zip_path)
+    except zipfile.BadZipFile:
+        return False
+
+
+def index_is_current(zip_path):
+    """True se l'indice esiste, e' leggibile e corrisponde all'archivio (es. non e' stato modificato a mano)."""
+    try:
+        with open(index_path_for(zip_path), 'r', encoding='utf-8') as f:
+            return _index_matches_archive(json.load(f), zip_path)
+    except (OSError, ValueError, AttributeError):
+        return False
+
+
+def load_index(zip_path):
+    """Carica l'indice dell'archivio. Restituisce {} se manca, e' illeggibile o non corrisponde all'archivio."""
+    index_path = index_path_for(zip_path)
+    if not os.path.exists(index_path) or not os.path.exists(zip_path):
+        return {}
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Indice '{index_path}' illeggibile: {e}")
+        return {}
+    if not _index_matches_archive(index, zip_path):
+        logger.warning(f"Indice '{index_path}' non allineato all'archivio '{zip_path}'.")
+        return {}
+    return index.get("members", {})
+
+
+def find_members(index, year=None, month=None, client=None):
+    """Nomi dei membri dell'indice che contengono il mese e/o il client richiesti."""
+    month_key = f"{year:04d}-{month:02d}" if year is not None and month is not None else None
+    return sorted(name for name, entry in index.items()
+                  if (month_key is None or entry.get("month") == month_key)
+                  and (client is None or client in entry.get("clients", [])))
+
+
+def read_member_lines(zip_path, member_name):
+    """Righe di testo di un membro dell'archivio."""
+    with zipfile.ZipFile(zip_path) as zf:
+        return zf.read(member_name).decode('utf-8', errors='replace').splitlines()
+
+
+def _merge_contents(existing, loose):
+    """Unisce al membro gia' archiviato le righe del file sciolto non ancora presenti."""
+    existing_lines = existing.decode('utf-8', errors='replace').splitlines()
+    seen = set(existing_lines)
+    new_lines = [line for line in loose.decode('utf-8', errors='replace').splitlines() if line not in seen]
+    if not new_lines:
+        return existing
+    return ("\n".join(existing_lines + new_lines) + "\n").encode('utf-8')
+
+
+def _fsync_path(path):
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
+
+
+def _write_json_atomically(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _write_index(zip_path, members):
+    _write_json_atomically(index_path_for(zip_path), {
+        "version": INDEX_VERSION,
+        "archive_size": os.path.getsize(zip_path),
+        "member_crcs": _member_crcs(zip_path),
+        "members": {name: build_member_index(name, content) for name, content in members.items()},
+    })
+
+
+def rebuild_index(zip_path):
+    """Rigenera l'indice leggendo tutti i membri dell'archivio. Restituisce True se riuscito."""
+    try:
+        with zipfile.ZipFile(zip_path) as zf:
+            members = {info.filename: zf.read(info) for info in zf.infolist()}
+        _write_index(zip_path, members)
+    except (OSError, zipfile.BadZipFile) as e:
+        logger.error(f"Impossibile rigenerare l'indice dell'archivio '{zip_path}': {e}")
+        return False
+    logger.info(f"Indice dell'archivio '{zip_path}' rigenerato ({len(members)} membri).")
+    return True
+
+
+def closed_month_logs(log_directory, now=None):
+    """File 'measurements.log.YYYY-MM' della directory relativi a mesi precedenti a quello corrente."""
+    now = now if now else datetime.datetime.now()
+    closed = []
+    if not os.path.isdir(log_directory):
+        return closed
+    for log_file_name in sorted(os.listdir(log_directory)):
+        match = MONTHLY_LOG_NAME_RE.match(log_file_name)
+        if match and (int(match.group(1)), int(match.group(2))) < (now.year, now.month):
+            closed.append(os.path.join(log_directory, log_file_name))
+    return closed
+
+
+def compact_closed_months(log_directory, zip_path, now=None):
+    """
+    Aggiunge all'archivio i log dei mesi chiusi, rigenera l'indice e rimuove i
+    file sciolti. Senza mesi da compattare rigenera solo l'indice, se manca o
+    non corrisponde piu' all'archivio (modificato a mano). Restituisce la lista
+    dei file compattati. In caso di errore l'archivio originale e i file
+    sciolti restano invariati.
+    """
+    loose_files = closed_month_logs(log_directory, now)
+    if not loose_files:
+        if os.path.exists(zip_path) and not index_is_current(zip_path):
+            rebuild_index(zip_path)
+        return []
+
+    # 1. Contenuto atteso dell'archivio: membri esistenti + log sciolti
+    members = {}
+    if os.path.exists(zip_path):
+        with zipfile.ZipFile(zip_path) as zf:
+            for info in zf.infolist():
+                members[info.filename] = zf.read(info)
+    for loose_path in loose_files:
+        member_name = os.path.basename(loose_path)
+        with open(loose_path, 'rb') as f:
+            loose_content = f.read()
+        members[member_name] = _merge_contents(members[member_name], loose_content) if member_name in members else loose_content
+    if not members:
+        return []
+
+    # 2. Scrittura in un file temporaneo e verifica
+    tmp_zip_path = zip_path + ".tmp"
+    try:
+        with zipfile.ZipFile(tmp_zip_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
+            for member_name in sorted(members):
+                zf.writestr(member_name, members[member_name])
+        with zipfile.ZipFile(tmp_zip_path) as zf:
+            bad_member = zf.testzip()
+            if bad_member is not None:
+                raise ArchiveVerificationError(f"CRC errato per il membro '{bad_member}'")
+            if sorted(zf.namelist()) != sorted(members):
+                raise ArchiveVerificationError("elenco dei membri diverso da quello atteso")
+            for member_name, content in members.items():
+                if hashlib.sha256(zf.read(member_name)).digest() != hashlib.sha256(content).digest():
+                    raise ArchiveVerificationError(f"checksum SHA-256 errato per il membro '{member_name}'")
+        _fsync_path(tmp_zip_path)
+    except (OSError, zipfile.BadZipFile, ArchiveVerificationError) as e:
+        logger.error(f"Compattazione in '{zip_path}' annullata: {e}")
+        if os.path.exists(tmp_zip_path):
+            os.remove(tmp_zip_path)
+        return []
+
+    # 3. Sostituzione atomica dell'archivio, poi indice, poi rimozione dei file sciolti
+    os.replace(tmp_zip_path, zip_path)
+    _write_index(zip_path, members)
+    for loose_path in loose_files:
+        try:
+            os.remove(loose_path)
+        except OSError as e:
+            logger.warning(f"File '{loose_path}' archiviato ma non rimosso: {e}")
+    if loose_files:
+        logger.info(f"Compattati in '{zip_path}': {[os.path.basename(p) for p in loose_files]}")
+    return loose_files
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    arg_parser = argparse.ArgumentParser(description="Compatta i log dei mesi chiusi nell'archivio zip indicizzato.")
+    arg_parser.add_argument("log_directory", help="Directory contenente i file measurements.log.YYYY-MM")
+    arg_parser.add_argument("archive_zip", nargs="?", help="Archivio di destinazione (default: measurements_arch.zip nella directory dei log)")
+    args = arg_parser.parse_args()
+
+    target_zip = args.archive_zip if args.archive_zip else os.path.join(args.log_directory, "measurements_arch.zip")
+    compacted = compact_closed_months(args.log_directory, target_zip)
+    logger.info(f"Compattazione completata: {len(compacted)} file aggiunti a '{target_zip}'.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
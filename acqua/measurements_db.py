@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Archivio SQLite indicizzato delle misurazioni.
+
+Il database (in modalita' WAL) contiene una riga per misurazione, ordinata
+fisicamente per (client, timestamp): le interrogazioni per mese, per gli
+ultimi N giorni o per l'ultimo valore di ogni client costano pochi
+millisecondi indipendentemente dalla lunghezza dello storico.
+
+Il caricamento iniziale importa i file 'measurements.log*' e gli archivi zip
+esistenti; i caricamenti successivi sono incrementali (si riparte dall'offset
+gia' importato di ogni file) e idempotenti (le righe gia' presenti vengono
+ignorate).
+
+Uso da riga di comando:
+    python3 measurements_db.py <file.db> <directory_log> [archivio.zip ...]
+"""
+
+import argparse
+import datetime
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+LOG_DATETIME_FORMAT = "%d/%m/%Y %H:%M"
+DB_DATETIME_FORMAT = "%Y-%m-%d %H:%M"
+INSERT_BATCH_SIZE = 1000
+
+MEASUREMENT_LOG_NAME_RE = re.compile(r"^measurements\.log(\.\d{4}-\d{2})?$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    client TEXT NOT NULL,
+    ts     TEXT NOT NULL,
+    level  REAL NOT NULL,
+    PRIMARY KEY (client, ts, level)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_measurements_ts ON measurements (ts);
+CREATE TABLE IF NOT EXISTS ingest_state (
+    source   TEXT PRIMARY KEY,
+    size     INTEGER NOT NULL,
+    offset   INTEGER NOT NULL,
+    identity TEXT NOT NULL DEFAULT ''
+);
+"""
+
+
+def open_database(db_path):
+    """Apre (creandolo se necessario) il database delle misurazioni in modalita' WAL."""
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    # Database creati prima dell'introduzione della colonna 'identity'
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(ingest_state)")}
+    if 'identity' not in columns:
+        conn.execute("ALTER TABLE ingest_state ADD COLUMN identity TEXT NOT NULL DEFAULT ''")
+    return conn
+
+
+def parse_measurement_line(rec):
+    """
+    Interpreta una riga di measurements.log
+    ('dd/mm/YYYY    HH:MM    livello    (Client: id[:porta])').
+    Restituisce la tupla (client, timestamp_db, livello) oppure None se la riga non e' valida.
+    """
+    parts = rec.split()
+    if len(parts) < 4:
+        return None
+    client_info_full = " ".join(parts[3:])
+    if not (client_info_full.startswith("(Client: ") and client_info_full.endswith(")")):
+        return None
+    client_ip = client_info_full[len("(Client: "):-1].split(':')[0]
+    try:
+        log_datetime = datetime.datetime.strptime(f"{parts[0]} {parts[1]}", LOG_DATETIME_FORMAT)
+        level = float(parts[2])
+    except ValueError:
+        return None
+    return (client_ip, log_datetime.strftime(DB_DATETIME_FORMAT), level)
+
+
+def _insert_lines(conn, lines):
+    """Inserisce le righe valide a blocchi con executemany. Restituisce il numero di righe nuove."""
+    changes_before = conn.total_changes
+    batch = []
+    for rec in lines:
+        row = parse_measurement_line(rec.strip())
+        if row is None:
+            continue
+        batch.append(row)
+        if len(batch) >= INSERT_BATCH_SIZE:
+            conn.executemany("INSERT OR IGNORE INTO measurements VALUES (?, ?, ?)", batch)
+            batch = []
+    if batch:
+        conn.executemany("INSERT OR IGNORE INTO measurements VALUES (?, ?, ?)", batch)
+    return conn.total_changes - changes_before
+
+
+def _get_ingest_state(conn, source):
+    """Restituisce (dimensione, offset, identita') dell'ultima importazione di 'source'."""
+    row = conn.execute("SELECT size, offset, identity FROM ingest_state WHERE source = ?", (source,)).fetchone()
+    return row if row else (0, 0, '')
+
+
+def _set_ingest_state(conn, source, size, offset, identity=''):
+    conn.execute("INSERT OR REPLACE INTO ingest_state (source, size, offset, identity) VALUES (?, ?, ?, ?)",
+                 (source, size, offset, identity))
+
+
+def _file_identity(log_file_path):
+    """
+    Identita' di un file di log: dispositivo, inode e hash della prima riga completa.
+    Cambia quando measurements.log viene ruotato e ricreato, anche se il nuovo file
+    ha gia' superato la dimensione importata del precedente.
+    """
+    stat = os.stat(log_file_path)
+    with open(log_file_path, 'rb') as fo:
+        first_line = fo.readline()
+    if not first_line.endswith(b'\n'):
+        first_line = b''  # Prima riga ancora in scrittura
+    return f"{stat.st_dev}:{stat.st_ino}:{hashlib.sha1(first_line).hexdigest()}"
+
+
+def ingest_log_file(conn, log_file_path):
+    """
+    Importa in modo incrementale un file di log: legge solo i byte successivi
+    all'ultimo offset importato (fino all'ultima riga completa). Se il file non
+    e' piu' lo stesso (rotazione mensile: cambia l'identita') o e' piu' corto
+    dell'offset salvato si riparte dall'inizio.
+    """
+    source = os.path.abspath(log_file_path)
+    try:
+        size = os.path.getsize(log_file_path)
+        identity = _file_identity(log_file_path)
+    except OSError as e:
+        logger.warning(f"Impossibile leggere la dimensione di '{log_file_path}': {e}")
+        return 0
+    _, offset, stored_identity = _get_ingest_state(conn, source)
+    if offset and identity != stored_identity:
+        logger.info(f"'{log_file_path}' e' stato sostituito (rotazione) dopo l'ultima importazione: reimportazione completa.")
+        offset = 0
+    elif size < offset:
+        logger.info(f"'{log_file_path}' e' piu' corto dell'offset importato ({size} < {offset}): reimportazione completa.")
+        offset = 0
+    if size == offset:
+        if identity != stored_identity:
+            with conn:
+                _set_ingest_state(conn, source, size, offset, identity)
+        return 0
+    with open(log_file_path, 'rb') as fo:
+        fo.seek(offset)
+        chunk = fo.read(size - offset)
+    if os.path.basename(log_file_path) == 'measurements.log':
+        # Nel file corrente l'ultima riga puo' essere ancora in scrittura: ci si ferma all'ultimo '\n'.
+        complete_len = chunk.rfind(b'\n') + 1
+        if complete_len == 0:
+            return 0
+    else:
+        complete_len = len(chunk)
+    lines = chunk[:complete_len].decode('utf-8', errors='replace').splitlines()
+    with conn:
+        inserted = _insert_lines(conn, lines)
+        _set_ingest_state(conn, source, size, offset + complete_len, identity)
+    if inserted:
+        logger.info(f"Importate {inserted} nuove misurazioni da '{log_file_path}'.")
+    return inserted
+
+
+def ingest_zip_archive(conn, zip_path):
+    """Importa i membri 'measurements.log.*' di un archivio zip. I membri gia' importati (stessa dimensione e CRC) sono saltati."""
+    inserted_total = 0
+    try:
+        with zipfile.ZipFile(zip_path) as zf:
+            for info in zf.infolist():
+                if not MEASUREMENT_LOG_NAME_RE.match(os.path.basename(info.filename)):
+                    continue
+                source = f"{os.path.abspath(zip_path)}!{info.filename}"
+                if _get_ingest_state(conn, source)[:2] == (info.file_size, info.CRC):
+                    continue
+                lines = zf.read(info).decode('utf-8', errors='replace').splitlines()
+                with conn:
+                    inserted = _insert_lines(conn, lines)
+                    # Per i membri zip l'offset memorizza il CRC: identifica il contenuto gia' importato.
+                    _set_ingest_state(conn, source, info.file_size, info.CRC)
+                inserted_total += inserted
+    except (zipfile.BadZipFile, OSError) as e:
+        logger.error(f"Errore durante l'importazione dell'archivio '{zip_path}': {e}")
+    if inserted_total:
+        logger.info(f"Importate {inserted_total} nuove misurazioni dall'archivio '{zip_path}'.")
+    return inserted_total
+
+
+def sync_from_log_directory(conn, log_directory, archive_zip_paths=()):
+    """Porta il database allineato a archivi zip, log mensili e measurements.log corrente."""
+    inserted = 0
+    for zip_path in archive_zip_paths:
+        if os.path.exists(zip_path):
+            inserted += ingest_zip_archive(conn, zip_path)
+    if os.path.isdir(log_directory):
+        # L'ordine garantisce che i mesi chiusi precedano il file corrente.
+        for log_file_name in sorted(os.listdir(log_directory), reverse=True):
+            if MEASUREMENT_LOG_NAME_RE.match(log_file_name):
+                inserted += ingest_log_file(conn, os.path.join(log_directory, log_file_name))
+    else:
+        logger.warning(f"Directory dei log '{log_directory}' non trovata: sincronizzazione del database saltata.")
+    return inserted
+
+
+def _to_rows(cursor):
+    return [(client, datetime.datetime.strptime(ts, DB_DATETIME_FORMAT), level) for client, ts, level in cursor]
+
+
+def query_range(conn, start_dt, end_dt, client=None):
+    """Restituisce le misurazioni [(client, datetime, livello)] con start_dt <= timestamp < end_dt."""
+    start_str, end_str = start_dt.strftime(DB_DATETIME_FORMAT), end_dt.strftime(DB_DATETIME_FORMAT)
+    if client is None:
+        cursor = conn.execute(
+            "SELECT client, ts, level FROM measurements WHERE ts >= ? AND ts < ? ORDER BY client, ts",
+            (start_str, end_str))
+    else:
+        cursor = conn.execute(
+            "SELECT client, ts, level FROM measurements WHERE client = ? AND ts >= ? AND ts < ? ORDER BY ts",
+            (client, start_str, end_str))
+    return _to_rows(cursor)
+
+
+def query_month(conn, year, month, client=None):
+    """Misurazioni di un mese solare."""
+    start_dt = datetime.datetime(year, month, 1)
+    end_dt = datetime.datetime(year + 1, 1, 1) if month == 12 else datetime.datetime(year, month + 1, 1)
+    return query_range(conn, start_dt, end_dt, client)
+
+
+def query_last_days(conn, days, now=None, client=None):
+    """Misurazioni degli ultimi N giorni."""
+    now = now if now else datetime.datetime.now()
+    return query_range(conn, now - datetime.timedelta(days=days), now + datetime.timedelta(minutes=1), client)
+
+
+def query_latest_per_client(conn):
+    """Ultima misurazione di ogni client: {client: (datetime, livello)}."""
+    cursor = conn.execute(
+        "SELECT m.client, m.ts, m.level FROM measurements m "
+        "JOIN (SELECT client, MAX(ts) AS max_ts FROM measurements GROUP BY client) last "
+        "ON m.client = last.client AND m.ts = last.max_ts ORDER BY m.client, m.level")
+    return {client: (ts, level) for client, ts, level in _to_rows(cursor)}
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    arg_parser = argparse.ArgumentParser(description="Importa i log delle misurazioni nel database SQLite indicizzato.")
+    arg_parser.add_argument("db_path", help="Percorso del file SQLite (creato se non esiste)")
+    arg_parser.add_argument("log_directory", help="Directory contenente measurements.log e i log mensili")
+    arg_parser.add_argument("archive_zip", nargs="*", help="Archivi zip di log mensili da importare")
+    args = arg_parser.parse_args()
+
+    db_conn = open_database(args.db_path)
+    try:
+        new_rows = sync_from_log_directory(db_conn, args.log_directory, args.archive_zip)
+        total_rows = db_conn.execute("SELECT COUNT(*) FROM measurements").fetchone()[0]
+        logger.info(f"Importazione completata: {new_rows} nuove misurazioni, {total_rows} totali.")
+        for client_id, (last_dt, last_level) in query_latest_per_client(db_conn).items():
+            logger.info(f"Ultima misurazione {client_id}: {last_dt.strftime('%d/%m/%Y %H:%M')} -> {last_level}")
+    finally:
+        db_conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
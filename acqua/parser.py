@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""Lettura delle misurazioni (file di log, archivio zip, database SQLite) nel formato usato dai grafici."""
+
+import collections
+import configparser
+import datetime
+import logging
+import os
+
+from . import measurements_archive, measurements_db
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 256
+
+
+def load_client_name_map(ini_file_path):
+    """Legge la sezione [ClientNames] (ip = nome) del file di mappatura dei client."""
+    config = configparser.ConfigParser()
+    loaded_map = {}
+    try:
+        if not ini_file_path or not os.path.exists(ini_file_path):
+            logger.warning(f"File di mappatura client '{ini_file_path}' non trovato. Verranno usati gli IP come nomi.")
+            return loaded_map
+        config.read(ini_file_path, encoding='utf-8')
+        if 'ClientNames' in config:
+            if config['ClientNames']:
+                for ip, name in config['ClientNames'].items():
+                    loaded_map[ip] = name
+                logger.info(f"Mappatura nomi client caricata da '{ini_file_path}'. {len(loaded_map)} voci trovate.")
+            else:
+                logger.warning(f"Sezione [ClientNames] trovata in '{ini_file_path}', ma è vuota.")
+        else:
+            logger.warning(f"Sezione [ClientNames] non trovata nel file '{ini_file_path}'.")
+    except configparser.Error as e:
+        logger.error(f"Errore durante la lettura del file di mappatura client '{ini_file_path}': {e}")
+    return loaded_map
+
+
+def _to_processed_data(raw_data_by_client_day):
+    processed_data = {}
+    for client_id, daily_data in raw_data_by_client_day.items():
+        if not daily_data: continue
+        sorted_days = sorted(daily_data.keys())
+        processed_data[client_id] = {"days": sorted_days, "values": [daily_data[day][1] for day in sorted_days]}
+    return processed_data
+
+
+def _to_readings(rows):
+    """Raggruppa per client le righe (client, datetime, livello) gia' ordinate per client e timestamp."""
+    readings = {}
+    for client_id, log_datetime, level in rows:
+        client_readings = readings.setdefault(client_id, {"times": [], "values": []})
+        client_readings["times"].append(log_datetime)
+        client_readings["values"].append(level)
+    return readings
+
+
+class LogParser:
+    """
+    Estrae, per ogni client, l'ultima misurazione di ogni giorno di un mese:
+    {client: {"days": [...], "values": [...]}}.
+
+    I risultati letti da file e archivi zip sono memorizzati in una cache
+    indicizzata per (percorso, dimensione, data di modifica, mese): in un
+    processo di lunga durata le esecuzioni successive rileggono solo i file
+    cambiati. I dizionari restituiti sono condivisi con la cache e non vanno modificati.
+    """
+
+    def __init__(self, client_name_map=None, cache_size=DEFAULT_CACHE_SIZE):
+        self.client_name_map = dict(client_name_map) if client_name_map else {}
+        self.cache_size = cache_size
+        self._cache = collections.OrderedDict()
+
+    def _cached(self, key, compute):
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        result = compute()
+        self._cache[key] = result
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    def _iter_records(self, lines, log_file_path, current_month, current_year):
+        """Genera (client, datetime, livello) per le righe valide del mese richiesto, segnalando quelle non valide."""
+        for line_num, rec in enumerate(lines, 1):
+            rec = rec.strip()
+            if not rec: continue
+            parts = rec.split()
+            if len(parts) >= 4:
+                try:
+                    date_str, time_str, level_str = parts[0], parts[1], parts[2]
+                    client_info_full = " ".join(parts[3:])
+                    if client_info_full.startswith("(Client: ") and client_info_full.endswith(")"):
+                        client_id_raw = client_info_full[len("(Client: "):-1]
+                        client_ip = client_id_raw.split(':')[0]
+                        client_id = self.client_name_map.get(client_ip, client_ip)
+                        datetime_str = f"{date_str} {time_str}"
+                        try:
+                            log_datetime = datetime.datetime.strptime(datetime_str, "%d/%m/%Y %H:%M")
+                        except ValueError:
+                            logger.warning(f"Riga {line_num}: Formato data/ora non valido '{datetime_str}' in '{log_file_path}'. Riga saltata: {rec}")
+                            continue
+                        if log_datetime.month != current_month or log_datetime.year != current_year:
+                            continue
+                        try:
+                            level = float(level_str)
+                        except ValueError:
+                            logger.warning(f"Riga {line_num}: Valore livello non valido '{level_str}' in '{log_file_path}'. Riga saltata: {rec}")
+                            continue
+                        yield client_id, log_datetime, level
+                    else:
+                        logger.warning(f"Riga {line_num}: Formato info client non riconosciuto '{client_info_full}' in '{log_file_path}'. Riga saltata: {rec}")
+                except IndexError:
+                    logger.warning(f"Riga {line_num}: Formato riga non valido (parti insufficienti) in '{log_file_path}'. Riga saltata: {rec}")
+                except Exception as e:
+                    logger.exception(f"Riga {line_num}: Errore imprevisto durante il parsing della riga '{rec}' in '{log_file_path}':")
+            else:
+                logger.warning(f"Riga {line_num}: Formato riga non valido (parti insufficienti) in '{log_file_path}'. Riga saltata: {rec}")
+
+    def parse_lines(self, lines, log_file_path, current_month, current_year):
+        """Estrae l'ultima misurazione di ogni giorno per ogni client. 'log_file_path' serve solo per i messaggi di log."""
+        raw_data_by_client_day = {}
+        for client_id, log_datetime, level in self._iter_records(lines, log_file_path, current_month, current_year):
+            day_of_month = log_datetime.day
+            if client_id not in raw_data_by_client_day:
+                raw_data_by_client_day[client_id] = {}
+            if day_of_month not in raw_data_by_client_day[client_id] or \
+               log_datetime > raw_data_by_client_day[client_id][day_of_month][0]:
+                raw_data_by_client_day[client_id][day_of_month] = (log_datetime, level)
+        processed_data = _to_processed_data(raw_data_by_client_day)
+        if not processed_data:
+            logger.info(f"Nessun dato valido trovato per {current_month}/{current_year} in '{log_file_path}'.")
+        else:
+            logger.info(f"Dati parsati con successo da '{log_file_path}' per {current_month}/{current_year}.")
+        return processed_data
+
+    def parse_readings(self, lines, log_file_path, current_month, current_year):
+        """Tutte le misurazioni del mese, in ordine cronologico: {client: {"times": [...], "values": [...]}}."""
+        rows = sorted(self._iter_records(lines, log_file_path, current_month, current_year), key=lambda row: (row[0], row[1]))
+        return _to_readings(rows)
+
+    def read_log_file(self, log_file_path, current_month, current_year, all_readings=False):
+        """Legge un file di log. Con all_readings=True restituisce tutte le misurazioni (vedi parse_readings)."""
+        if not os.path.exists(log_file_path):
+            logger.warning(f"File di log '{log_file_path}' non trovato per mese {current_month}/{current_year}.")
+            return {}
+        parse = self.parse_readings if all_readings else self.parse_lines
+        try:
+            stat = os.stat(log_file_path)
+            key = ("file", os.path.abspath(log_file_path), stat.st_size, stat.st_mtime_ns, current_month, current_year, all_readings)
+
+            def compute():
+                with open(log_file_path, 'r', encoding='utf-8') as fo:
+                    return parse(fo, log_file_path, current_month, current_year)
+            return self._cached(key, compute)
+        except Exception as e:
+            logger.exception(f"Errore imprevisto durante l'elaborazione del file '{log_file_path}':")
+            return {}
+
+    def read_archive_member(self, zip_path, member_name, current_month, current_year, all_readings=False):
+        """Come read_log_file, per un log mensile contenuto nell'archivio zip."""
+        source_label = f"{zip_path}!{member_name}"
+        parse = self.parse_readings if all_readings else self.parse_lines
+        try:
+            stat = os.stat(zip_path)
+            key = ("zip", os.path.abspath(zip_path), member_name, stat.st_size, stat.st_mtime_ns, current_month, current_year, all_readings)
+            return self._cached(key, lambda: parse(
+                measurements_archive.read_member_lines(zip_path, member_name), source_label, current_month, current_year))
+        except Exception as e:
+            logger.exception(f"Errore imprevisto durante l'elaborazione di '{source_label}':")
+            return {}
+
+    def read_month_from_db(self, conn, current_month, current_year):
+        """Come read_log_file, ma con una query indicizzata sull'archivio SQLite."""
+        raw_data_by_client_day = {}
+        for client_ip, log_datetime, level in measurements_db.query_month(conn, current_year, current_month):
+            client_id = self.client_name_map.get(client_ip, client_ip)
+            day_of_month = log_datetime.day
+            if client_id not in raw_data_by_client_day:
+                raw_data_by_client_day[client_id] = {}
+            if day_of_month not in raw_data_by_client_day[client_id] or \
+               log_datetime > raw_data_by_client_day[client_id][day_of_month][0]:
+                raw_data_by_client_day[client_id][day_of_month] = (log_datetime, level)
+        processed_data = _to_processed_data(raw_data_by_client_day)
+        logger.info(f"Dati letti dall'archivio SQLite per {current_month}/{current_year}: {len(processed_data)} client.")
+        return processed_data
+
+    def read_readings_from_db(self, conn, current_month, current_year):
+        """Come read_month_from_db, ma con tutte le misurazioni del mese (vedi parse_readings)."""
+        rows = [(self.client_name_map.get(client_ip, client_ip), log_datetime, level)
+                for client_ip, log_datetime, level in measurements_db.query_month(conn, current_year, current_month)]
+        rows.sort(key=lambda row: (row[0], row[1]))
+        return _to_readings(rows)
+
+    def read_month(self, log_file_path, current_month, current_year, archive_member=None, db_conn=None, all_readings=False):
+        """
+        Legge i dati del mese dall'archivio SQLite se 'db_conn' e' indicato, altrimenti dal file di log
+        (o, se 'archive_member' e' indicato, dal membro dell'archivio zip 'log_file_path').
+        Con all_readings=True restituisce tutte le misurazioni invece dell'ultima di ogni giorno.
+        """
+        if db_conn is not None:
+            try:
+                if all_readings:
+                    return self.read_readings_from_db(db_conn, current_month, current_year)
+                return self.read_month_from_db(db_conn, current_month, current_year)
+            except Exception as e:
+                logger.exception(f"Errore durante la lettura dall'archivio SQLite per {current_month}/{current_year}. Fallback al file di log:")
+        if archive_member:
+            return self.read_archive_member(log_file_path, archive_member, current_month, current_year, all_readings)
+        return self.read_log_file(log_file_path, current_month, current_year, all_readings)
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""Pubblicazione delle pagine generate su GitHub Pages (commit e push del repository)."""
+
+import datetime
+import logging
+import os
+
+from git import Repo
+
+logger = logging.getLogger(__name__)
+
+
+class GitPublisher:
+    """Esegue commit e push dei file indicati nel repository configurato in Settings."""
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    def publish(self, files_to_add, commit_time=None):
+        """Restituisce True se e' stato creato e inviato un commit."""
+        try:
+            repo = Repo(self.settings.path_of_git_repo)
+            existing_files_to_add = [f for f in files_to_add if os.path.exists(f)]
+            if not existing_files_to_add:
+                logger.info("Nessun file HTML nuovo o modificato da committare.")
+                return False
+            repo.index.add(existing_files_to_add)
+            if not repo.index.diff(repo.head.commit) and not repo.is_dirty(untracked_files=True):
+                logger.info("Nessuna modifica rilevata nei file HTML da committare.")
+                return False
+            commit_time = commit_time if commit_time else datetime.datetime.now()
+            commit_message = f'Aggiornamento misurazione acqua del {commit_time.strftime("%d-%m-%Y %H:%M")}'
+            repo.index.commit(commit_message)
+            origin = repo.remote(name='origin')
+            origin.push()
+            logger.info(f"File {existing_files_to_add} caricati su GITHUB PAGES!")
+            return True
+        except Exception as e:
+            logger.exception(f'Errore durante il push del codice su GitHub Pages:')
+            return False
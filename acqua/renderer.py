@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""Generazione delle pagine HTML con i grafici Plotly."""
+
+import calendar
+import datetime
+import logging
+import os
+import re
+
+import pandas as pd # Utile per Plotly Express
+import plotly.express as px
+import plotly.io as pio
+
+from .mese import mese
+
+logger = logging.getLogger(__name__)
+
+
+class PlotlyRenderer:
+    """Genera le pagine dei grafici mensili nelle directory indicate da Settings."""
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    def archive_html_path_for(self, client_id, log_year, log_month):
+        safe_client_id = re.sub(r'[^\w\-\.]', '_', client_id)
+        archive_html_filename = f"grafico_{log_year}-{log_month:02d}_{safe_client_id}.html"
+        return os.path.join(self.settings.archive_dir_path, archive_html_filename) # Salva nella sottocartella archivio
+
+    def save_page(self, data_input, page_main_title, year, month_num, output_html_path, is_main_index_page=False, now=None):
+        """Genera la pagina e la scrive in output_html_path. Restituisce True se il file e' stato scritto."""
+        html_content = self.render_page(data_input, page_main_title, year, month_num, output_html_path, is_main_index_page, now)
+        try:
+            with open(output_html_path, 'w', encoding='utf-8') as f:
+                f.write(html_content)
+            logger.info(f"Grafico Plotly HTML salvato in '{output_html_path}'")
+            return True
+        except IOError as e:
+            logger.error(f"Impossibile scrivere il file HTML Plotly '{output_html_path}': {e}")
+            return False
+
+    def save_archive_month_graphs(self, archived_month_data_all_clients, log_year, log_month, source_name, now=None):
+        """Genera un file HTML di archivio per ogni client del mese. Restituisce i percorsi generati."""
+        archived_files_generated = []
+        if not archived_month_data_all_clients:
+            logger.info(f"Nessun dato da processare per l'archivio {source_name}.")
+            return archived_files_generated
+        mese_str_archivio = mese(log_month)
+        for client_id, client_specific_data in archived_month_data_all_clients.items():
+            if not client_specific_data.get("days"):
+                logger.info(f"Nessun giorno con dati per il client '{client_id}' nell'archivio {source_name}.")
+                continue
+            data_for_graph = {client_id: client_specific_data}
+            archive_html_filepath = self.archive_html_path_for(client_id, log_year, log_month)
+            archive_page_title = f"{mese_str_archivio} {log_year} (Client: {client_id})"
+            self.save_page(
+                data_for_graph,
+                archive_page_title,
+                log_year,
+                log_month, # Passa il numero del mese
+                archive_html_filepath,
+                is_main_index_page=False,
+                now=now
+            )
+            archived_files_generated.append(archive_html_filepath)
+        return archived_files_generated
+
+    def render_page(self, data_input, page_main_title, year, month_num, output_html_path, is_main_index_page=False, now=None):
+        """Restituisce l'HTML della pagina: un grafico per client (pagina principale) o per il solo client dell'archivio."""
+        settings = self.settings
+        now = now if now else datetime.datetime.now()
+        html_body_content = ""
+        plotly_js_included = False # Per includere Plotly.js solo una volta per pagina
+
+        if not data_input:
+            logger.warning(f"Nessun dato fornito per generare grafici Plotly per: {page_main_title} in {output_html_path}.")
+            html_body_content = f"<p>Nessun dato disponibile per {page_main_title}.</p>"
+        else:
+            clients_to_graph = data_input.items()
+            num_clients_with_data = 0
+
+            for client_id, client_specific_data in clients_to_graph:
+                if not client_specific_data or not client_specific_data.get("days"):
+                    logger.info(f"Nessun giorno con dati per il client '{client_id}' per {page_main_title}. Grafico Plotly per questo client saltato.")
+                    if is_main_index_page:
+                        html_body_content += f"<h2>Livello acqua {client_id}</h2><p>Nessun dato disponibile per questo client nel periodo.</p><hr/>\n"
+                    # else: per file archivio singolo, questo caso è gestito da data_input vuoto
+                    continue
+            
+                num_clients_with_data += 1
+            
+                # Ottieni il numero di giorni nel mese
+                num_days_in_month = calendar.monthrange(year, month_num)[1]
+                all_days_in_month = list(range(1, num_days_in_month + 1))
+            
+                # Crea un dizionario Giorno -> Valore solo per i giorni con dati
+                client_data_dict = dict(zip(client_specific_data["days"], client_specific_data["values"]))
+            
+                # Crea la lista di valori per tutti i giorni del mese (None per i giorni senza dati)
+                df_client = pd.DataFrame({
+                    'Giorno': all_days_in_month,
+                    'Altezza acqua (cm)': [client_data_dict.get(day, None) for day in all_days_in_month]
+                })
+
+                graph_specific_title = f"{page_main_title} (Client: {client_id})" if is_main_index_page else page_main_title
+            
+                fig = px.bar(df_client, 
+                             x='Giorno', 
+                             y='Altezza acqua (cm)', 
+                             title=f'Livello acqua - {graph_specific_title}',
+                             text='Altezza acqua (cm)') # Mostra valori sulle barre
+            
+                # Imposta l'asse X come categorico prima di definire il range specifico
+                fig.update_xaxes(type='category')
+
+                initial_xaxis_range = None
+
+                # Calcola l'intervallo per l'asse X basato sugli ultimi 10 *dati* solo per la pagina principale
+                if is_main_index_page:
+                    # Filtra il DataFrame per includere solo i giorni con dati
+                    df_with_data = df_client.dropna(subset=['Altezza acqua (cm)'])
+
+                    if not df_with_data.empty:
+                        # Prendi gli ultimi 10 giorni *con dati*
+                        last_10_data_points = df_with_data.tail(10)
+
+                        # Ottieni il primo e l'ultimo giorno da questo subset
+                        first_day_in_range = last_10_data_points['Giorno'].min()
+                        last_day_in_range = last_10_data_points['Giorno'].max()
+
+                        # Per un migliore controllo dello zoom su asse categorico, usiamo gli indici delle categorie.
+                        # Le categorie sull'asse saranno stringhe dei giorni del mese.
+                        # 'all_days_in_month' contiene i giorni numerici (es. 1, 2, ..., 31)
+                        categories_on_axis_str = [str(d) for d in all_days_in_month] # Lista di tutti i giorni del mese come stringhe
+
+                        first_day_str_for_index = str(first_day_in_range)
+                        last_day_str_for_index = str(last_day_in_range)
+                        try:
+                            start_index = categories_on_axis_str.index(first_day_str_for_index)
+                            end_index = categories_on_axis_str.index(last_day_str_for_index)
+                            # Applica un padding (-0.5 e +0.5) agli indici per assicurare che le barre estreme siano completamente visibili
+                            initial_xaxis_range = [start_index - 0.5, end_index + 0.5]
+                            logger.info(f"Impostato range asse X per '{client_id}' su indici [{initial_xaxis_range[0]:.1f}, {initial_xaxis_range[1]:.1f}] (corrispondenti ai giorni '{first_day_in_range}' - '{last_day_in_range}').")
+                        except ValueError:
+                            # Questo non dovrebbe accadere se first/last_day_in_range provengono da all_days_in_month
+                            logger.warning(f"Uno dei giorni '{first_day_in_range}' o '{last_day_in_range}' non trovato in categories_on_axis_str per '{client_id}'. Fallback a range stringhe: [{first_day_str_for_index}, {last_day_str_for_index}]")
+                            initial_xaxis_range = [first_day_str_for_index, last_day_str_for_index] # Fallback al metodo precedente
+                    else:
+                        logger.info(f"Nessun dato disponibile per il client '{client_id}' per impostare un range iniziale sull'asse X.")
+
+
+                fig.update_traces(texttemplate='%{text:.0f}', textposition='outside')
+                fig.update_layout(
+                    yaxis_range=[0, 400],
+                    xaxis_title=f'Giorno del mese ({mese(month_num)} {year})', # Titolo asse X più descrittivo
+                    yaxis_title='Altezza acqua (cm)', # Etichetta asse Y
+                    bargap=0.2 # Spazio tra le barre di giorni diversi
+                )
+                if initial_xaxis_range: # Applica il range solo se calcolato
+                    fig.update_layout(xaxis_range=initial_xaxis_range)
+
+                include_js = 'cdn' if not plotly_js_included else False
+                html_fig_for_client = pio.to_html(fig, full_html=False, include_plotlyjs=include_js)
+                if include_js == 'cdn':
+                    plotly_js_included = True
+
+                if is_main_index_page:
+                    html_body_content += f"<h2>Livello acqua {client_id}</h2>\n{html_fig_for_client}\n<hr/>\n"
+                else: # Pagina di archivio per singolo client
+                    html_body_content = html_fig_for_client
+                    break # Per i file di archivio, c'è un solo client per file
+
+            if num_clients_with_data == 0 and is_main_index_page: # Se nessun client aveva dati graficabili
+                 html_body_content = f"<p>Nessun dato graficabile disponibile per i client nel periodo {page_main_title}.</p>"
+
+        # Costruzione HTML finale
+        html_content = f"<html><head>\n"
+        html_content += f"    <meta charset=\"utf-8\" />\n"
+        html_content += f"    <meta name=\"viewport\" content=\"width=device-width, initial-scale=1.0\" />\n" # <-- VIEWPORT META TAG AGGIUNTO
+        html_content += f"    <title>Grafico Livello acqua {page_main_title}</title>\n</head>\n"
+        html_content += f"<body><h1>Grafico Livello acqua - {page_main_title}</h1>\n"
+        html_content += html_body_content
+
+        # Aggiungi link ad altri grafici e archivi
+        html_content += "\n<h2>Altri Grafici e Archivi</h2>\n"
+    
+        # Colleziona tutti i file HTML nel repository (root e archivio), escludendo quello corrente
+        all_other_html_files_in_repo = []
+    
+        # Cerca nella directory root del repository
+        if os.path.exists(settings.repo_root_dir):
+            for f in os.listdir(settings.repo_root_dir):
+                full_path = os.path.join(settings.repo_root_dir, f)
+                if f.endswith(".html") and full_path != output_html_path and full_path != settings.archive_dir_path: # Escludi la cartella archivio stessa
+                     all_other_html_files_in_repo.append({"full_path": full_path, "relative_path": f})
+
+        # Cerca nella sottodirectory di archivio
+        if os.path.exists(settings.archive_dir_path):
+            for f in os.listdir(settings.archive_dir_path):
+                full_path = os.path.join(settings.archive_dir_path, f)
+                if f.endswith(".html") and full_path != output_html_path:
+                     all_other_html_files_in_repo.append({"full_path": full_path, "relative_path": os.path.join(os.path.basename(settings.archive_dir_path), f)})
+
+        # Struttura per raggruppare i link degli archivi: {anno: [info_link, ...]}
+        archived_links_by_year = {}
+        link_to_index_page_info = None # Per le pagine di archivio che linkano a index.html
+        link_to_dashboard_info = None # Cruscotto con tutti i client, se generato
+        for file_item in all_other_html_files_in_repo: # file_item è un dizionario {"full_path": ..., "relative_path": ...}
+            # Controlla se il file corrente è la pagina principale (index.html) e non stiamo generando la pagina principale stessa
+            if file_item["full_path"] == settings.html_output_path and output_html_path != settings.html_output_path : # Siamo su una pagina di archivio, linkiamo a index.html
+                # Determina il mese/anno corrente per il display name di index.html
+                # Se stiamo generando un archivio, month_num e year sono del periodo dell'archivio.
+                # Per il link a index.html, vogliamo il mese/anno corrente effettivo.
+                now_dt_for_index_link = now
+            
+                # Calcola il percorso relativo da output_html_path (che è nell'archivio) a settings.html_output_path (che è nella root)
+                # Esempio: se output_html_path è 'archivio/grafico.html' e settings.html_output_path è 'index.html',
+                # il percorso relativo sarà '../index.html'
+                relative_link_to_index = os.path.relpath(settings.html_output_path, os.path.dirname(output_html_path))
+                link_to_index_page_info = {
+                    "filename": relative_link_to_index, # Usa il percorso relativo calcolato
+                    "display_name": f"Grafici Mese Corrente ({mese(now_dt_for_index_link.month)} {now_dt_for_index_link.year})",
+                }
+            elif file_item["full_path"] == settings.dashboard_path:
+                link_to_dashboard_info = {
+                    "filename": os.path.relpath(settings.dashboard_path, os.path.dirname(output_html_path)),
+                    "display_name": "Cruscotto di tutti i client",
+                }
+            elif file_item["relative_path"].startswith(os.path.basename(settings.archive_dir_path) + os.sep + "grafico_"): # Se è un file di archivio nella sottocartella
+                match_archive = re.match(r"grafico_(\d{4})-(\d{2})_(.+)\.html", os.path.basename(file_item["relative_path"]))
+                if match_archive:
+                    year_str, month_str, client_part = match_archive.groups()
+                    year_val = int(year_str)
+                    month_val = int(month_str)
+                    display_name = f"{mese(month_val)} {year_str} (Client: {client_part.replace('_', ' ')})"
+
+                    if year_val not in archived_links_by_year:
+                        archived_links_by_year[year_val] = []
+                    archived_links_by_year[year_val].append({
+                        # Calcola il percorso relativo corretto dall'HTML corrente al file di archivio di destinazione
+                        "filename": os.path.relpath(file_item["full_path"], os.path.dirname(output_html_path)),                    "display_name": display_name,
+                        "month": month_val,
+                        "client": client_part
+                    })
+
+        # Genera l'HTML per i link
+        links_html_generated = False
+        if link_to_dashboard_info:
+            html_content += f"<ul><li><a href=\"{link_to_dashboard_info['filename']}\">{link_to_dashboard_info['display_name']}</a></li></ul>\n"
+            links_html_generated = True
+        if link_to_index_page_info and output_html_path != settings.html_output_path: # Questo sarà vero solo per le pagine di archivio
+            html_content += f"<ul><li><a href=\"{link_to_index_page_info['filename']}\">{link_to_index_page_info['display_name']}</a></li></ul>\n"
+            links_html_generated = True
+    
+        if archived_links_by_year:
+            # Ordina gli anni degli archivi in modo decrescente
+            sorted_archive_years = sorted(archived_links_by_year.keys(), reverse=True)
+            for archive_year_val in sorted_archive_years:
+                html_content += f"<h3>Archivi Anno {archive_year_val}</h3>\n<ul>\n"
+                # Ordina i link per mese (decrescente) e poi per nome client (crescente)
+                links_in_year = sorted(archived_links_by_year[archive_year_val], key=lambda x: (x.get("month", 0), x.get("client", "")), reverse=False)
+                links_in_year.sort(key=lambda x: x.get("month",0), reverse=True) # Ordinamento primario per mese decrescente
+            
+                for link_info in links_in_year:
+                    html_content += f"    <li><a href=\"{link_info['filename']}\">{link_info['display_name']}</a></li>\n"
+                html_content += "</ul>\n"
+            links_html_generated = True
+
+        if not links_html_generated:
+            html_content += "<ul><li>Nessun altro grafico o archivio disponibile.</li></ul>\n"
+            
+        html_content += f"<p><em>Ultimo aggiornamento: {now.strftime('%d-%m-%Y %H:%M:%S')}</em></p>\n"
+        html_content += "</body></html>\n"
+        return html_content
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""Configurazione del generatore di grafici: lettura di config.ini e risoluzione dei percorsi."""
+
+import configparser
+import dataclasses
+import logging
+import os
+import sys
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigError(ValueError):
+    """Configurazione mancante o non valida."""
+    pass
+
+
+@dataclasses.dataclass
+class Settings:
+    """Percorsi e opzioni di un sito. Puo' essere costruito direttamente o letto da config.ini con load_settings()."""
+    repo_root_dir: str
+    log_directory: str
+    client_map_ini_file: str = None
+    git_repo_subdir: str = '.git'
+    html_output_filename: str = 'index.html'
+    archive_subdir_name: str = 'archivio'
+    log_archive_filename: str = 'measurements_arch.zip'
+    compact_closed_months: bool = False
+    use_sqlite_db: bool = False
+    sqlite_filename: str = 'measurements.db'
+    extra_archive_zip_filenames: tuple = ()
+    generate_dashboard: bool = False
+    dashboard_filename: str = 'dashboard.html'
+    dashboard_data_subdir: str = 'dati'
+
+    @property
+    def path_of_git_repo(self):
+        return os.path.join(self.repo_root_dir, self.git_repo_subdir)
+
+    @property
+    def html_output_path(self):
+        return os.path.join(self.repo_root_dir, self.html_output_filename)
+
+    @property
+    def archive_dir_path(self):
+        return os.path.join(self.repo_root_dir, self.archive_subdir_name)
+
+    @property
+    def dashboard_path(self):
+        return os.path.join(self.repo_root_dir, self.dashboard_filename)
+
+    @property
+    def dashboard_data_dir_path(self):
+        return os.path.join(self.repo_root_dir, self.dashboard_data_subdir)
+
+    @property
+    def measurement_log_file_path(self):
+        return os.path.join(self.log_directory, 'measurements.log')
+
+    @property
+    def script_event_log_file(self):
+        return os.path.join(self.log_directory, 'graph_generator_events_plotly.log')
+
+    @property
+    def log_archive_zip_path(self):
+        return os.path.join(self.log_directory, self.log_archive_filename)
+
+    @property
+    def sqlite_db_path(self):
+        return os.path.join(self.log_directory, self.sqlite_filename)
+
+    @property
+    def archive_zip_paths(self):
+        """Archivi zip da importare nel database: quelli configurati piu' l'archivio dei mesi chiusi."""
+        paths = [os.path.join(self.log_directory, name) for name in self.extra_archive_zip_filenames]
+        if self.log_archive_zip_path not in paths:
+            paths.append(self.log_archive_zip_path)
+        return paths
+
+
+def _first_existing(primary, fallback, exists, description):
+    if exists(primary):
+        return primary
+    logger.info(f"Percorso primario {description} non trovato ({primary}). Uso fallback: {fallback}")
+    return fallback
+
+
+def load_settings(config_file_path, platform=None):
+    """
+    Legge config.ini e restituisce un oggetto Settings. La directory dei log e
+    il file di mappatura dei client vengono cercati prima accanto alla
+    directory che contiene config.ini, poi al suo interno.
+    Solleva ConfigError se il file manca o non e' valido.
+    """
+    platform = platform if platform else sys.platform
+    if not os.path.exists(config_file_path):
+        raise ConfigError(f"File di configurazione '{config_file_path}' non trovato.")
+    config = configparser.ConfigParser()
+    try:
+        config.read(config_file_path)
+
+        # Percorsi Repository
+        if platform.startswith('win'):
+            repo_root_dir = config.get('Paths', 'repo_root_dir_windows', fallback=None)
+            if not repo_root_dir:
+                raise ConfigError("Chiave 'repo_root_dir_windows' non trovata o vuota in config.ini")
+            logger.info(f"Rilevato ambiente Windows. REPO_ROOT_DIR impostato a: {repo_root_dir}")
+        elif platform.startswith('linux'):
+            repo_root_dir = config.get('Paths', 'repo_root_dir_raspberry', fallback=None)
+            if not repo_root_dir:
+                raise ConfigError("Chiave 'repo_root_dir_raspberry' non trovata o vuota in config.ini")
+            logger.info(f"Rilevato ambiente Linux/Raspberry Pi. REPO_ROOT_DIR impostato a: {repo_root_dir}")
+        else:
+            raise ConfigError(f"Sistema operativo non supportato: {platform}")
+        if not os.path.isdir(repo_root_dir):
+            raise ConfigError(f"La directory del repository '{repo_root_dir}' specificata in config.ini non esiste o non è una directory.")
+
+        # Percorsi Log e Client Map
+        config_dir = os.path.dirname(os.path.abspath(config_file_path))
+        parent_of_config_dir = os.path.dirname(config_dir)
+        log_dir_name = config.get('Paths', 'log_directory_name', fallback='logs')
+        client_map_filename = config.get('Paths', 'client_map_filename', fallback='client_map.ini')
+        log_directory = _first_existing(os.path.join(parent_of_config_dir, log_dir_name),
+                                        os.path.join(config_dir, log_dir_name), os.path.isdir, "dei log")
+        client_map_ini_file = _first_existing(os.path.join(parent_of_config_dir, client_map_filename),
+                                              os.path.join(config_dir, client_map_filename), os.path.exists, "del file client_map.ini")
+
+        archive_zip_filenames = config.get('Database', 'archive_zip_filenames', fallback='measurements_arch.zip')
+        return Settings(
+            repo_root_dir=repo_root_dir,
+            log_directory=log_directory,
+            client_map_ini_file=client_map_ini_file,
+            git_repo_subdir=config.get('Git', 'git_repo_subdir', fallback='.git'),
+            html_output_filename=config.get('Output', 'html_output_filename', fallback='index.html'),
+            archive_subdir_name=config.get('Output', 'archive_subdir_name', fallback='archivio'),
+            generate_dashboard=config.getboolean('Output', 'generate_dashboard', fallback=False),
+            dashboard_filename=config.get('Output', 'dashboard_filename', fallback='dashboard.html'),
+            dashboard_data_subdir=config.get('Output', 'dashboard_data_subdir', fallback='dati'),
+            log_archive_filename=config.get('Archive', 'log_archive_filename', fallback='measurements_arch.zip'),
+            compact_closed_months=config.getboolean('Archive', 'compact_closed_months', fallback=False),
+            use_sqlite_db=config.getboolean('Database', 'use_sqlite', fallback=False),
+            sqlite_filename=config.get('Database', 'sqlite_filename', fallback='measurements.db'),
+            extra_archive_zip_filenames=tuple(name.strip() for name in archive_zip_filenames.split(',') if name.strip()),
+        )
+    except ConfigError:
+        raise
+    except (configparser.Error, ValueError) as e:
+        raise ConfigError(f"Errore durante la lettura del file di configurazione '{config_file_path}': {e}") from e
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""Generazione completa del sito: pagine di archivio e pagina del mese corrente."""
+
+import datetime
+import logging
+import os
+import re
+
+from . import measurements_archive, measurements_db
+from .dashboard import DashboardRenderer
+from .mese import mese
+from .parser import LogParser, load_client_name_map
+from .renderer import PlotlyRenderer
+
+logger = logging.getLogger(__name__)
+
+
+class SiteGenerator:
+    """
+    Collega Settings, LogParser e PlotlyRenderer. Un'istanza puo' essere
+    riusata per piu' esecuzioni nello stesso processo: la cache del parser
+    evita di rileggere i log non modificati.
+    """
+
+    def __init__(self, settings, parser=None, renderer=None, dashboard=None):
+        self.settings = settings
+        self.parser = parser if parser else LogParser(load_client_name_map(settings.client_map_ini_file))
+        self.renderer = renderer if renderer else PlotlyRenderer(settings)
+        self.dashboard = dashboard if dashboard else DashboardRenderer(settings)
+        self.db_conn = None # Connessione all'archivio SQLite, se abilitato
+
+    def compact_closed_months(self, now=None):
+        if not self.settings.compact_closed_months:
+            # Anche senza compattazione l'indice deve seguire l'archivio (es. modificato a mano),
+            # altrimenti i mesi archiviati non vengono letti.
+            zip_path = self.settings.log_archive_zip_path
+            if os.path.exists(zip_path) and not measurements_archive.index_is_current(zip_path):
+                measurements_archive.rebuild_index(zip_path)
+            return []
+        try:
+            return measurements_archive.compact_closed_months(self.settings.log_directory, self.settings.log_archive_zip_path, now=now)
+        except Exception as e:
+            logger.exception(f"Errore durante la compattazione dei log mensili in '{self.settings.log_archive_zip_path}':")
+            return []
+
+    def open_measurements_db(self):
+        """Apre l'archivio SQLite e lo allinea ai file di log. In caso di errore resta None (si usano i file di testo)."""
+        if not self.settings.use_sqlite_db:
+            return None
+        try:
+            if self.db_conn is None:
+                self.db_conn = measurements_db.open_database(self.settings.sqlite_db_path)
+            inserted = measurements_db.sync_from_log_directory(self.db_conn, self.settings.log_directory, self.settings.archive_zip_paths)
+            logger.info(f"Archivio SQLite '{self.settings.sqlite_db_path}' sincronizzato ({inserted} nuove misurazioni).")
+        except Exception as e:
+            logger.exception(f"Impossibile usare l'archivio SQLite '{self.settings.sqlite_db_path}'. Verranno letti i file di log:")
+            self.close()
+        return self.db_conn
+
+    def close(self):
+        if self.db_conn is not None:
+            self.db_conn.close()
+            self.db_conn = None
+
+    def read_month(self, log_file_path, month, year, archive_member=None, all_readings=False):
+        return self.parser.read_month(log_file_path, month, year, archive_member=archive_member,
+                                      db_conn=self.db_conn, all_readings=all_readings)
+
+    def _archive_page_links_outdated(self, page_path, archive_pages):
+        """True se la pagina di archivio non linka esattamente le altre pagine di archivio (e il cruscotto, se esiste)."""
+        try:
+            with open(page_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except OSError:
+            return True
+        expected = {os.path.basename(p) for p in archive_pages if p != page_path}
+        linked = set(re.findall(r'href="(grafico_[^"/]+\.html)"', content))
+        dashboard_href = 'href="' + os.path.relpath(self.settings.dashboard_path, self.settings.archive_dir_path) + '"'
+        return linked != expected or (dashboard_href in content) != os.path.exists(self.settings.dashboard_path)
+
+    def generate_archives(self, now=None):
+        """
+        Genera le pagine di archivio dei mesi chiusi. Quelle dei mesi compattati nell'archivio zip
+        vengono create se mancano e riscritte solo quando l'elenco delle pagine di archivio cambia
+        (i link in fondo alla pagina non sarebbero piu' completi). Restituisce i percorsi generati.
+        """
+        settings = self.settings
+        archived_files_generated = []
+        page_sources = {} # pagina -> (percorso, membro dello zip o None, anno, mese)
+        if not os.path.exists(settings.log_directory):
+            logger.error(f"La directory dei log '{settings.log_directory}' non esiste. Impossibile processare gli archivi.")
+            return archived_files_generated
+
+        # Assicura che la directory di archivio esista
+        if not os.path.exists(settings.archive_dir_path):
+            try:
+                os.makedirs(settings.archive_dir_path)
+                logger.info(f"Directory di archivio creata: {settings.archive_dir_path}")
+            except OSError as e:
+                logger.error(f"Impossibile creare la directory di archivio {settings.archive_dir_path}: {e}. L'archiviazione fallirà.")
+        loose_months = set()
+        log_files = [f for f in os.listdir(settings.log_directory) if f.startswith("measurements.log.")]
+        for log_file_name in log_files:
+            match = re.match(r"measurements\.log\.(\d{4})-(\d{2})", log_file_name)
+            if match:
+                log_year, log_month = int(match.group(1)), int(match.group(2))
+                loose_months.add((log_year, log_month))
+                log_path = os.path.join(settings.log_directory, log_file_name)
+                logger.info(f"Processando dati archiviati per {mese(log_month)} {log_year} da {log_path}")
+                archived_month_data_all_clients = self.read_month(log_path, log_month, log_year)
+                for client_id in archived_month_data_all_clients:
+                    page_sources[self.renderer.archive_html_path_for(client_id, log_year, log_month)] = (log_path, None, log_year, log_month)
+                archived_files_generated.extend(self.renderer.save_archive_month_graphs(
+                    archived_month_data_all_clients, log_year, log_month, log_file_name, now=now))
+
+        # Mesi compattati nell'archivio zip: l'indice indica quali client contiene ogni mese,
+        # per cui si aprono solo i membri con grafici ancora da generare.
+        client_name_map = self.parser.client_name_map
+        archive_index = measurements_archive.load_index(settings.log_archive_zip_path)
+        for member_name in measurements_archive.find_members(archive_index):
+            member_entry = archive_index[member_name]
+            if not member_entry.get("month"):
+                continue
+            log_year, log_month = (int(part) for part in member_entry["month"].split('-'))
+            if (log_year, log_month) in loose_months:
+                continue # Il file sciolto, piu' aggiornato, e' gia' stato processato
+            member_clients = {client_name_map.get(c, c) for c in member_entry.get("clients", [])}
+            for client_id in member_clients:
+                page_sources[self.renderer.archive_html_path_for(client_id, log_year, log_month)] = (
+                    settings.log_archive_zip_path, member_name, log_year, log_month)
+            missing_clients = {c for c in member_clients if not os.path.exists(self.renderer.archive_html_path_for(c, log_year, log_month))}
+            if not missing_clients:
+                continue
+            logger.info(f"Processando dati archiviati per {mese(log_month)} {log_year} da {settings.log_archive_zip_path}!{member_name} (client: {sorted(missing_clients)})")
+            archived_month_data_all_clients = self.read_month(settings.log_archive_zip_path, log_month, log_year, archive_member=member_name)
+            archived_month_data_missing = {c: d for c, d in archived_month_data_all_clients.items() if c in missing_clients}
+            archived_files_generated.extend(self.renderer.save_archive_month_graphs(
+                archived_month_data_missing, log_year, log_month, member_name, now=now))
+
+        # Solo ora l'elenco delle pagine e' completo: si riscrivono quelle con i link non aggiornati
+        # (pagine dei mesi zip create in esecuzioni precedenti, o scritte prima delle altre in questa).
+        archive_pages = [os.path.join(settings.archive_dir_path, f) for f in os.listdir(settings.archive_dir_path)
+                         if f.startswith("grafico_") and f.endswith(".html")] if os.path.isdir(settings.archive_dir_path) else []
+        outdated_by_source = {}
+        for page_path in archive_pages:
+            if page_path in page_sources and self._archive_page_links_outdated(page_path, archive_pages):
+                outdated_by_source.setdefault(page_sources[page_path], set()).add(page_path)
+        for (source_path, member_name, log_year, log_month), pages in sorted(outdated_by_source.items(), key=lambda item: item[0][2:]):
+            logger.info(f"Aggiornamento dei link di {len(pages)} pagine di archivio di {mese(log_month)} {log_year}.")
+            archived_month_data_all_clients = self.read_month(source_path, log_month, log_year, archive_member=member_name)
+            archived_month_data_outdated = {c: d for c, d in archived_month_data_all_clients.items()
+                                            if self.renderer.archive_html_path_for(c, log_year, log_month) in pages}
+            archived_files_generated.extend(self.renderer.save_archive_month_graphs(
+                archived_month_data_outdated, log_year, log_month, member_name or os.path.basename(source_path), now=now))
+        return list(dict.fromkeys(archived_files_generated))
+
+    def generate_dashboard(self, now=None):
+        """
+        Esporta i dati mensili del cruscotto e scrive dashboard.html. I mesi con un file di log
+        sciolto (compreso il mese corrente) vengono sempre riesportati, quelli compattati
+        nell'archivio zip solo se il loro file JSON manca. Restituisce i file modificati.
+        """
+        now = now if now else datetime.datetime.now()
+        settings = self.settings
+        if not settings.generate_dashboard:
+            return []
+        if not os.path.exists(settings.log_directory):
+            logger.error(f"La directory dei log '{settings.log_directory}' non esiste. Impossibile generare il cruscotto.")
+            return []
+        if not self.dashboard.ensure_data_directory():
+            return []
+
+        # (anno, mese) -> (percorso, membro dell'archivio zip o None)
+        month_sources = {}
+        for log_file_name in os.listdir(settings.log_directory):
+            match = re.match(r"measurements\.log\.(\d{4})-(\d{2})", log_file_name)
+            if match:
+                month_sources[(int(match.group(1)), int(match.group(2)))] = (os.path.join(settings.log_directory, log_file_name), None)
+        month_sources[(now.year, now.month)] = (settings.measurement_log_file_path, None)
+        archive_index = measurements_archive.load_index(settings.log_archive_zip_path)
+        for member_name in measurements_archive.find_members(archive_index):
+            month_str = archive_index[member_name].get("month")
+            if not month_str:
+                continue
+            log_year, log_month = (int(part) for part in month_str.split('-'))
+            if (log_year, log_month) not in month_sources and not os.path.isfile(self.dashboard.month_data_path(log_year, log_month)):
+                month_sources[(log_year, log_month)] = (settings.log_archive_zip_path, member_name)
+
+        changed_files = []
+        manifest = self.dashboard.load_manifest()
+        manifest = {month_str: entry for month_str, entry in manifest.items()
+                    if os.path.isfile(os.path.join(settings.dashboard_data_dir_path, f"{month_str}.json"))}
+        for (log_year, log_month), (source_path, member_name) in sorted(month_sources.items()):
+            readings = self.read_month(source_path, log_month, log_year, archive_member=member_name, all_readings=True)
+            if not readings:
+                continue
+            written_path, manifest_entry = self.dashboard.save_month(log_year, log_month, readings)
+            if manifest_entry is None:
+                continue
+            manifest[f"{log_year:04d}-{log_month:02d}"] = manifest_entry
+            if written_path:
+                changed_files.append(written_path)
+        for written_path in (self.dashboard.save_manifest(manifest), self.dashboard.save_page()):
+            if written_path:
+                changed_files.append(written_path)
+        return changed_files
+
+    def generate_current_month(self, now=None):
+        """Genera la pagina principale (index.html) del mese di 'now'. Restituisce il percorso se scritto, altrimenti None."""
+        now = now if now else datetime.datetime.now()
+        settings = self.settings
+        current_month_name = mese(now.month)
+        logger.info(f"Lettura dati per il mese corrente: {current_month_name} {now.year} da {settings.measurement_log_file_path}")
+        current_month_data_all_clients = self.read_month(settings.measurement_log_file_path, now.month, now.year)
+        logger.info(f"Generazione di {settings.html_output_path} (index) per il mese corrente con Plotly: {current_month_name} {now.year}")
+        written = self.renderer.save_page(
+            current_month_data_all_clients,
+            f"{current_month_name} {now.year}",
+            now.year,
+            now.month, # Passa il numero del mese corrente
+            settings.html_output_path,
+            is_main_index_page=True,
+            now=now
+        )
+        return settings.html_output_path if written else None
+
+    def generate(self, now=None):
+        """
+        Esecuzione completa: compattazione dei mesi chiusi, sincronizzazione del
+        database, cruscotto, pagine di archivio e poi index.html (che linka gli
+        archivi appena creati). Restituisce l'elenco dei file da pubblicare.
+        """
+        now = now if now else datetime.datetime.now()
+        self.compact_closed_months(now)
+        self.open_measurements_db()
+
+        generated_html_files = []
+        try:
+            dashboard_files = self.generate_dashboard(now)
+        except Exception:
+            logger.exception("Errore durante la generazione del cruscotto. Proseguo con le altre pagine:")
+            dashboard_files = []
+        generated_html_files.extend(dashboard_files)
+        if dashboard_files:
+            logger.info(f"File del cruscotto aggiornati: {dashboard_files}")
+
+        logger.info("Inizio processamento log archiviati con Plotly...")
+        archived_htmls = self.generate_archives(now)
+        generated_html_files.extend(archived_htmls)
+        logger.info(f"File HTML Plotly archiviati generati: {archived_htmls}")
+
+        index_html = self.generate_current_month(now)
+        if index_html:
+            generated_html_files.append(index_html)
+        return [f for f in generated_html_files if os.path.exists(f)]
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Server di ricezione delle misurazioni (porta 50008).
+
+Accetta sia i relay singoli (readTelnetAndSendToServer5.py: un valore per
+connessione, restituito come eco) sia i gateway multi-sensore
+(readTelnetAndSendToServer6.py: protocollo multiplexato di relay_protocol.py)
+e registra ogni lettura in measurements.log nel formato letto da
+readFileAndGraph_v3_plotly.py, ruotando il file all'inizio di ogni mese.
+
+Le letture dei gateway gia' registrate (stesso gateway e sorgente, sequenza
+non superiore all'ultima vista) vengono scartate: ritrasmissioni e recuperi
+di arretrati sono sicuri senza dover rileggere il log.
+
+Uso:
+    python3 acquaGatewayServer.py [--host 0.0.0.0] [--port 50008] [--log-directory logs]
+"""
+
+import argparse
+import collections
+import datetime
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+
+import relay_protocol
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PORT = 50008
+CONNECTION_TIMEOUT = 60
+DEFAULT_MAX_TRACKED_CLIENTS = 1024
+
+logger = logging.getLogger(__name__)
+
+
+class MeasurementLogWriter:
+    """
+    Scrive le righe di measurements.log in modo thread-safe, con rotazione mensile (measurements.log.YYYY-MM).
+    Ogni lettura finisce nel file del proprio mese: quelle di mesi gia' chiusi (es. un arretrato
+    recuperato dopo un'interruzione a cavallo del cambio mese) vengono aggiunte al relativo
+    measurements.log.YYYY-MM, quelle datate dopo il mese corrente restano in measurements.log.
+    """
+
+    def __init__(self, log_directory):
+        self.log_directory = log_directory
+        self.log_file_path = os.path.join(log_directory, 'measurements.log')
+        self.lock = threading.Lock()
+        self.current_year_month = None
+        self.file = None
+
+    def _rotate_if_needed(self, now_dt):
+        target = (now_dt.year, now_dt.month)
+        if self.current_year_month == target:
+            return
+        if self.file:
+            self.file.close()
+            self.file = None
+        if os.path.exists(self.log_file_path):
+            if self.current_year_month is not None:
+                prev_year, prev_month = self.current_year_month
+            else:
+                mod_dt = datetime.datetime.fromtimestamp(os.path.getmtime(self.log_file_path))
+                prev_year, prev_month = mod_dt.year, mod_dt.month
+            if (prev_year, prev_month) != target:
+                archive_path = self.month_log_path(prev_year, prev_month)
+                try:
+                    if os.path.exists(archive_path):
+                        # Il file del mese esiste gia' (letture arretrate): si accoda invece di sovrascriverlo
+                        with open(self.log_file_path, 'rb') as src, open(archive_path, 'ab') as dst:
+                            dst.write(src.read())
+                            dst.flush()
+                            os.fsync(dst.fileno())
+                        os.remove(self.log_file_path)
+                    else:
+                        os.rename(self.log_file_path, archive_path)
+                    logger.info(f"File {self.log_file_path} archiviato come {archive_path}.")
+                except OSError as e:
+                    logger.error(f"Errore durante l'archiviazione di {self.log_file_path} a {archive_path}: {e}")
+        self.file = open(self.log_file_path, 'a', encoding='utf-8')
+        self.current_year_month = target
+
+    def month_log_path(self, year, month):
+        return f"{self.log_file_path}.{year:04d}-{month:02d}"
+
+    def write_readings(self, readings):
+        """Registra le letture [(client, datetime, dato)] nel file del loro mese e forza la scrittura su disco."""
+        with self.lock:
+            self._rotate_if_needed(datetime.datetime.now())
+            lines_by_closed_month = collections.defaultdict(list)
+            for client, reading_dt, data in readings:
+                line = f"{reading_dt.strftime('%d/%m/%Y')}    {reading_dt.strftime('%H:%M')}    {data}    (Client: {client})\n"
+                if (reading_dt.year, reading_dt.month) < self.current_year_month:
+                    lines_by_closed_month[(reading_dt.year, reading_dt.month)].append(line)
+                else:
+                    self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            for (year, month), lines in sorted(lines_by_closed_month.items()):
+                month_path = self.month_log_path(year, month)
+                with open(month_path, 'a', encoding='utf-8') as f:
+                    f.writelines(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+                logger.info(f"{len(lines)} letture arretrate registrate in {month_path}.")
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+
+class SequenceWindow:
+    """
+    Ultima sequenza registrata per ogni coppia (gateway, sorgente) (high-water
+    mark), limitata alle 'max_clients' coppie viste piu' di recente e salvata
+    su file JSON dopo ogni batch. Le sequenze di una sorgente arrivano in
+    ordine, quindi basta un intero per coppia per riconoscere i duplicati.
+    La numerazione di un gateway non influisce su quella degli altri, anche
+    se usano gli stessi nomi di sorgente (es. lo strumento di replay).
+    """
+
+    def __init__(self, state_path, max_clients=DEFAULT_MAX_TRACKED_CLIENTS):
+        self.state_path = state_path
+        self.max_clients = max_clients
+        self.lock = threading.Lock()
+        self.high_water_marks = collections.OrderedDict()
+        if os.path.exists(state_path):
+            try:
+                with open(state_path, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+                for entry in entries:
+                    if len(entry) != 3:
+                        continue # Formato precedente, indicizzato solo per sorgente: non piu' valido
+                    gateway_id, source, seq = entry
+                    self.high_water_marks[(gateway_id, source)] = int(seq)
+                if len(self.high_water_marks) < len(entries):
+                    logger.warning(f"Ignorate {len(entries) - len(self.high_water_marks)} voci di '{state_path}' nel formato precedente (senza id del gateway).")
+                logger.info(f"Stato delle sequenze caricato da '{state_path}' ({len(self.high_water_marks)} coppie gateway/sorgente).")
+            except (OSError, ValueError, TypeError) as e:
+                logger.error(f"Stato delle sequenze '{state_path}' illeggibile: {e}. La deduplicazione riparte da zero.")
+                self.high_water_marks.clear()
+
+    def record_new(self, gateway_id, readings, write_fn):
+        """
+        Passa a write_fn solo le letture [(sorgente, sequenza, ...)] del gateway non ancora
+        viste, poi aggiorna e salva i contatori. Restituisce il numero di duplicati scartati.
+        """
+        with self.lock:
+            fresh = []
+            batch_marks = {}
+            for reading in readings:
+                key, seq = (gateway_id, reading[0]), reading[1]
+                if seq <= batch_marks.get(key, self.high_water_marks.get(key, -1)):
+                    continue
+                batch_marks[key] = seq
+                fresh.append(reading)
+            if fresh:
+                # Prima si scrive il log, poi lo stato: un'interruzione tra i due
+                # puo' al piu' duplicare una lettura, mai perderla.
+                write_fn(fresh)
+                for key, seq in batch_marks.items():
+                    self.high_water_marks.pop(key, None)
+                    self.high_water_marks[key] = seq
+                while len(self.high_water_marks) > self.max_clients:
+                    self.high_water_marks.popitem(last=False)
+                self._save()
+            return len(readings) - len(fresh)
+
+    def _save(self):
+        tmp_path = self.state_path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump([[gateway_id, source, seq] for (gateway_id, source), seq in self.high_water_marks.items()], f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            logger.error(f"Impossibile salvare lo stato delle sequenze in '{self.state_path}': {e}")
+
+
+class MeasurementRequestHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        client_ip, client_port = self.client_address[0], self.client_address[1]
+        self.request.settimeout(CONNECTION_TIMEOUT)
+        try:
+            first_chunk = self.receive_first_chunk()
+            if not first_chunk:
+                return
+            if first_chunk.startswith(relay_protocol.PROTOCOL_MAGIC.encode('ascii')):
+                self.handle_gateway(first_chunk)
+            else:
+                self.handle_legacy(first_chunk, f"{client_ip}:{client_port}")
+        except socket.timeout:
+            logger.warning(f"Timeout sulla connessione da {client_ip}:{client_port}.")
+        except (socket.error, relay_protocol.ProtocolError) as e:
+            logger.warning(f"Connessione da {client_ip}:{client_port} interrotta: {e}")
+
+    def receive_first_chunk(self):
+        """
+        Legge i primi byte della connessione. Finche' sono un prefisso di 'RUGGERO/' senza
+        a capo (TCP puo' consegnare l'intestazione a pezzi) si continua a leggere, per non
+        scambiare un gateway per un relay singolo. I relay singoli inviano un valore numerico,
+        che non e' mai un prefisso dell'intestazione.
+        """
+        magic = relay_protocol.PROTOCOL_MAGIC.encode('ascii')
+        buffer = self.request.recv(1024)
+        while buffer and len(buffer) < len(magic) and magic.startswith(buffer) and b"\n" not in buffer:
+            chunk = self.request.recv(1024)
+            if not chunk:
+                break
+            buffer += chunk
+        return buffer
+
+    def handle_legacy(self, data, client_id):
+        """Relay singolo: un valore per connessione, restituito come eco."""
+        value = data.decode('utf-8', errors='replace').strip()
+        self.server.log_writer.write_readings([(client_id, datetime.datetime.now(), value)])
+        logger.info(f"Ricevuto da {client_id}: '{value}'")
+        self.request.sendall(data)
+
+    def handle_gateway(self, buffer):
+        """Gateway multi-sensore: batch di letture confermati con 'OK <n>'."""
+        gateway_id = None
+        batch = []
+        while True:
+            while b"\n" not in buffer:
+                chunk = self.request.recv(4096)
+                if not chunk:
+                    return
+                buffer += chunk
+            raw_line, buffer = buffer.split(b"\n", 1)
+            line = raw_line.decode('utf-8', errors='replace').strip()
+            if not line:
+                continue
+            if gateway_id is None:
+                try:
+                    gateway_id = relay_protocol.decode_header(line)
+                except relay_protocol.ProtocolError as e:
+                    self.request.sendall(relay_protocol.encode_error(str(e)).encode('utf-8'))
+                    raise
+                logger.info(f"Gateway '{gateway_id}' connesso da {self.client_address[0]}.")
+                continue
+            declared_count = relay_protocol.decode_batch_end(line)
+            if declared_count is None:
+                batch.append(relay_protocol.decode_reading(line))
+                continue
+            if declared_count != len(batch):
+                raise relay_protocol.ProtocolError(f"batch dichiarato di {declared_count} letture, ricevute {len(batch)}")
+            duplicates = self.server.sequence_window.record_new(gateway_id, batch, self.write_gateway_readings)
+            logger.info(f"Gateway '{gateway_id}': registrate {len(batch) - duplicates} letture, {duplicates} duplicati scartati.")
+            self.request.sendall(relay_protocol.encode_ack(len(batch)).encode('utf-8'))
+            batch = []
+
+    def write_gateway_readings(self, readings):
+        self.server.log_writer.write_readings(
+            [(source, datetime.datetime.fromtimestamp(timestamp), data) for source, _, timestamp, data in readings])
+
+
+class MeasurementServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, server_address, log_writer, sequence_window):
+        super().__init__(server_address, MeasurementRequestHandler)
+        self.log_writer = log_writer
+        self.sequence_window = sequence_window
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    arg_parser = argparse.ArgumentParser(description="Server di ricezione delle misurazioni.")
+    arg_parser.add_argument("--host", default="0.0.0.0")
+    arg_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    arg_parser.add_argument("--log-directory", default=os.path.join(SCRIPT_DIR, "logs"))
+    arg_parser.add_argument("--max-tracked-clients", type=int, default=DEFAULT_MAX_TRACKED_CLIENTS,
+                            help="Numero massimo di coppie (gateway, sorgente) di cui ricordare l'ultima sequenza")
+    args = arg_parser.parse_args()
+
+    os.makedirs(args.log_directory, exist_ok=True)
+    writer = MeasurementLogWriter(args.log_directory)
+    window = SequenceWindow(os.path.join(args.log_directory, 'sequence_state.json'), args.max_tracked_clients)
+    with MeasurementServer((args.host, args.port), writer, window) as server:
+        logger.info(f"Server in ascolto su {args.host}:{args.port}, log in {args.log_directory}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Arresto del server richiesto dall'utente.")
+        finally:
+            writer.close()
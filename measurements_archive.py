@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compatibilita': la compattazione dei log mensili si trova in acqua/measurements_archive.py.
+
+Uso da riga di comando:
+    python3 measurements_archive.py <directory_log> [archivio.zip]
+"""
+
+from acqua.measurements_archive import *  # noqa: F401,F403
+from acqua.measurements_archive import main
+
+if __name__ == "__main__":
+    raise SystemExit(main())
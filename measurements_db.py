@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compatibilita': l'archivio SQLite delle misurazioni si trova in acqua/measurements_db.py.
+
+Uso da riga di comando:
+    python3 measurements_db.py <file.db> <directory_log> [archivio.zip ...]
+"""
+
+from acqua.measurements_db import *  # noqa: F401,F403
+from acqua.measurements_db import main
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+"""
+Gateway multi-sensore: legge in parallelo tutti i sensori Telnet elencati in
+gateway.ini e inoltra le letture al server su un'unica connessione,
+a blocchi, con il protocollo definito in relay_protocol.py.
+
+Le letture non confermate dal server vengono salvate in un file di spool
+e ritrasmesse all'esecuzione successiva, anche nella modalita' a ciclo
+singolo (poll_interval = 0, avvio da cron).
+
+Compatibile con Python 2 (Arduino Yun) e Python 3.
+
+Uso:
+    python readTelnetAndSendToServer6.py [percorso/gateway.ini]
+"""
+import os
+import socket
+import sys
+import threading
+import time
+
+try:
+    import ConfigParser as configparser  # Python 2
+    import Queue as queue
+except ImportError:
+    import configparser
+    import queue
+
+import relay_protocol
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONFIG_FILE_PATH = os.path.join(SCRIPT_DIR, 'gateway.ini')
+DEFAULT_SEQUENCE_STATE_PATH = os.path.join(SCRIPT_DIR, 'gateway_sequence.state')
+DEFAULT_PENDING_SPOOL_PATH = os.path.join(SCRIPT_DIR, 'gateway_pending.spool')
+
+
+class GatewaySettings(object):
+    """Configurazione del gateway letta da gateway.ini."""
+
+    def __init__(self):
+        self.server_host = '192.168.178.28'
+        self.server_port = 50008
+        self.gateway_id = socket.gethostname()
+        self.upstream_timeout = 10.0
+        self.batch_size = 20
+        self.max_pending = 1000
+        self.max_parallel = 4
+        self.sensor_timeout = 10.0
+        self.poll_interval = 0      # Secondi tra due letture; 0 = una sola lettura e uscita
+        self.sequence_state_path = DEFAULT_SEQUENCE_STATE_PATH
+        self.pending_spool_path = DEFAULT_PENDING_SPOOL_PATH
+        self.sensors = []           # Lista di tuple (nome, host, porta)
+
+
+def _get_option(config, section, option, default, converter=str):
+    # Python 2 non supporta 'fallback' in ConfigParser.get
+    if config.has_option(section, option):
+        return converter(config.get(section, option))
+    return default
+
+
+def load_gateway_config(config_file_path):
+    """Legge gateway.ini. Solleva ValueError se il file manca o non elenca sensori validi."""
+    if not os.path.exists(config_file_path):
+        raise ValueError("File di configurazione '" + config_file_path + "' non trovato.")
+    config = configparser.ConfigParser()
+    config.optionxform = str  # Mantiene maiuscole/minuscole dei nomi dei sensori
+    config.read(config_file_path)
+
+    settings = GatewaySettings()
+    settings.server_host = _get_option(config, 'Upstream', 'server_host', settings.server_host)
+    settings.server_port = _get_option(config, 'Upstream', 'server_port', settings.server_port, int)
+    settings.gateway_id = _get_option(config, 'Upstream', 'gateway_id', settings.gateway_id)
+    settings.upstream_timeout = _get_option(config, 'Upstream', 'timeout', settings.upstream_timeout, float)
+    settings.batch_size = max(1, _get_option(config, 'Upstream', 'batch_size', settings.batch_size, int))
+    settings.max_pending = _get_option(config, 'Upstream', 'max_pending', settings.max_pending, int)
+    settings.max_parallel = max(1, _get_option(config, 'Polling', 'max_parallel', settings.max_parallel, int))
+    settings.sensor_timeout = _get_option(config, 'Polling', 'sensor_timeout', settings.sensor_timeout, float)
+    settings.poll_interval = _get_option(config, 'Polling', 'poll_interval', settings.poll_interval, float)
+    settings.sequence_state_path = _get_option(config, 'Upstream', 'sequence_state_file', settings.sequence_state_path)
+    settings.pending_spool_path = _get_option(config, 'Upstream', 'pending_spool_file', settings.pending_spool_path)
+
+    if not config.has_section('Sensors'):
+        raise ValueError("Sezione [Sensors] non trovata in '" + config_file_path + "'.")
+    for name, endpoint in config.items('Sensors'):
+        host, _, port_str = endpoint.strip().rpartition(':')
+        if not host or not port_str.isdigit() or " " in name:
+            raise ValueError("Sensore '" + name + "' non valido: atteso 'nome = host:porta', trovato '" + endpoint + "'.")
+        settings.sensors.append((name, host, int(port_str)))
+    if not settings.sensors:
+        raise ValueError("Nessun sensore configurato nella sezione [Sensors].")
+    return settings
+
+
+def _write_lines_atomically(path, lines):
+    """Scrive le righe in un file temporaneo, forza la scrittura su disco e lo rinomina sul file di destinazione."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        for line in lines:
+            f.write(line + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    if os.name == "nt" and os.path.exists(path):
+        os.remove(path)  # os.rename su Windows non sovrascrive (Python 2 non ha os.replace)
+    os.rename(tmp_path, path)
+
+
+class SequenceCounter(object):
+    """
+    Numeri di sequenza per sensore, salvati su file prima dell'invio in modo
+    da non riusarli mai, neanche dopo un riavvio. Un sensore senza stato
+    salvato parte dal timestamp corrente: con al piu' una lettura al secondo
+    resta sopra le sequenze gia' viste dal server anche se il file va perso.
+    """
+
+    def __init__(self, state_path):
+        self.state_path = state_path
+        self.last_seq = {}
+        if os.path.exists(state_path):
+            try:
+                with open(state_path) as f:
+                    for line in f:
+                        parts = line.split()
+                        if len(parts) == 2:
+                            self.last_seq[parts[0]] = int(parts[1])
+            except (IOError, ValueError) as e:
+                print("Attenzione: stato delle sequenze '" + state_path + "' illeggibile (" + str(e) + "). Si riparte dal timestamp corrente.")
+                self.last_seq = {}
+
+    def assign(self, readings):
+        """Trasforma [(nome, timestamp, dato)] in [(nome, sequenza, timestamp, dato)] e salva lo stato."""
+        numbered = []
+        for name, timestamp, data in readings:
+            if name in self.last_seq:
+                seq = self.last_seq[name] + 1
+            else:
+                seq = int(time.time())
+            self.last_seq[name] = seq
+            numbered.append((name, seq, timestamp, data))
+        if numbered:
+            self.save()
+        return numbered
+
+    def save(self):
+        _write_lines_atomically(self.state_path, [name + " " + str(self.last_seq[name]) for name in sorted(self.last_seq)])
+
+
+class PendingSpool(object):
+    """
+    Letture numerate non ancora confermate dal server, conservate su file tra
+    un'esecuzione e l'altra (una riga 'nome sequenza timestamp dato' per lettura).
+    """
+
+    def __init__(self, spool_path, max_pending):
+        self.spool_path = spool_path
+        self.max_pending = max_pending
+
+    def load(self):
+        """Restituisce le letture salvate [(nome, sequenza, timestamp, dato)], al piu' le ultime max_pending."""
+        readings = []
+        if not os.path.exists(self.spool_path):
+            return readings
+        try:
+            with open(self.spool_path) as f:
+                for line in f:
+                    parts = line.rstrip("\n").split(" ", 3)
+                    if len(parts) == 4:
+                        readings.append((parts[0], int(parts[1]), int(parts[2]), parts[3]))
+        except (IOError, ValueError) as e:
+            print("Attenzione: spool delle letture in sospeso '" + self.spool_path + "' illeggibile (" + str(e) + ").")
+        if readings:
+            print("Recuperate " + str(len(readings)) + " letture in sospeso da '" + self.spool_path + "'.")
+        return self.trim(readings)
+
+    def trim(self, readings):
+        if len(readings) > self.max_pending:
+            print("Attenzione: scartate " + str(len(readings) - self.max_pending) + " letture in sospeso piu' vecchie.")
+            return readings[-self.max_pending:]
+        return readings
+
+    def save(self, readings):
+        """Salva le letture in sospeso (con lista vuota lo spool viene svuotato). Gli errori vengono segnalati, non sollevati."""
+        if not readings and not os.path.exists(self.spool_path):
+            return
+        try:
+            _write_lines_atomically(self.spool_path, [name + " " + str(seq) + " " + str(timestamp) + " " + data
+                                                       for name, seq, timestamp, data in readings])
+        except (IOError, OSError) as e:
+            print("ERRORE: impossibile salvare lo spool delle letture in sospeso '" + self.spool_path + "' (" + str(e) + ").")
+
+
+class LineReader(object):
+    """Lettura bufferizzata di linee (terminate da \\n) da una socket, con scadenza complessiva."""
+
+    def __init__(self, sock, deadline=None):
+        self.sock = sock
+        self.deadline = deadline
+        self.buffer = b""
+
+    def readline(self):
+        """Restituisce la linea senza terminatore, None se la connessione e' chiusa. Solleva socket.timeout alla scadenza."""
+        while b"\n" not in self.buffer:
+            if self.deadline is not None:
+                remaining = self.deadline - time.time()
+                if remaining <= 0:
+                    raise socket.timeout("scadenza superata")
+                self.sock.settimeout(remaining)
+            chunk = self.sock.recv(1024)
+            if not chunk:
+                return None
+            self.buffer += chunk
+        line, self.buffer = self.buffer.split(b"\n", 1)
+        return line.decode("utf-8", "replace").rstrip("\r")
+
+
+def read_data_from_sensor(name, host, port, timeout):
+    """
+    Si connette al sensore Telnet, scarta la prima linea e restituisce la seconda,
+    oppure None in caso di errore. L'intera lettura deve concludersi entro 'timeout' secondi.
+    """
+    s1 = None
+    try:
+        s1 = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s1.settimeout(timeout)
+        s1.connect((host, port))
+        reader = LineReader(s1, deadline=time.time() + timeout)
+        if reader.readline() is None:  # Banner o linea vuota
+            print("[" + name + "] Errore: connessione chiusa prematuramente durante la lettura.")
+            return None
+        data_line = reader.readline()
+        if data_line is None:
+            print("[" + name + "] Errore: connessione chiusa prematuramente durante la lettura.")
+            return None
+        print("[" + name + "] Dati letti da " + host + ":" + str(port) + ": '" + data_line + "'")
+        return data_line
+    except socket.timeout:
+        print("[" + name + "] Errore: timeout durante la lettura da " + host + ":" + str(port))
+        return None
+    except socket.error as e:
+        print("[" + name + "] Errore socket: " + str(e))
+        return None
+    finally:
+        if s1:
+            s1.close()
+
+
+def poll_sensors(sensors, max_parallel, sensor_timeout):
+    """
+    Legge tutti i sensori con al massimo 'max_parallel' connessioni contemporanee.
+    Restituisce la lista delle letture riuscite [(nome, timestamp_unix, dato)].
+    """
+    jobs = queue.Queue()
+    for sensor in sensors:
+        jobs.put(sensor)
+    readings = []
+    readings_lock = threading.Lock()
+
+    def worker():
+        while True:
+            try:
+                name, host, port = jobs.get_nowait()
+            except queue.Empty:
+                return
+            data = read_data_from_sensor(name, host, port, sensor_timeout)
+            if data:
+                with readings_lock:
+                    readings.append((name, int(time.time()), data))
+
+    threads = [threading.Thread(target=worker) for _ in range(min(max_parallel, len(sensors)))]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for t in threads:
+        t.join()
+    return readings
+
+
+class UpstreamConnection(object):
+    """Connessione persistente verso il server, riaperta automaticamente in caso di errore."""
+
+    def __init__(self, host, port, gateway_id, timeout):
+        self.host = host
+        self.port = port
+        self.gateway_id = gateway_id
+        self.timeout = timeout
+        self.sock = None
+        self.reader = None
+
+    def connect(self):
+        self.close()
+        print("Connessione al server " + self.host + ":" + str(self.port))
+        self.sock = socket.create_connection((self.host, self.port), self.timeout)
+        self.sock.settimeout(self.timeout)
+        self.reader = LineReader(self.sock)
+        self.sock.sendall(relay_protocol.encode_header(self.gateway_id).encode("utf-8"))
+
+    def send_batch(self, readings):
+        """Invia un batch e attende la conferma del server. Solleva socket.error o ProtocolError in caso di errore."""
+        if self.sock is None:
+            self.connect()
+        self.sock.sendall(relay_protocol.encode_batch(readings).encode("utf-8"))
+        ack_line = self.reader.readline()
+        if ack_line is None:
+            raise socket.error("connessione chiusa dal server prima della conferma")
+        acked = relay_protocol.decode_ack(ack_line)
+        if acked != len(readings):
+            raise relay_protocol.ProtocolError("confermate " + str(acked) + " letture su " + str(len(readings)))
+
+    def close(self):
+        if self.sock:
+            try:
+                self.sock.close()
+            except socket.error:
+                pass
+        self.sock = None
+        self.reader = None
+
+
+def forward_readings(upstream, readings, batch_size):
+    """
+    Inoltra le letture a blocchi di 'batch_size'. In caso di errore riapre la
+    connessione e ritenta una volta: il server scarta le letture gia' ricevute
+    grazie ai numeri di sequenza. Restituisce le letture non confermate.
+    """
+    for start in range(0, len(readings), batch_size):
+        batch = readings[start:start + batch_size]
+        for attempt in (1, 2):
+            try:
+                upstream.send_batch(batch)
+                print("Inviate al server " + str(len(batch)) + " letture.")
+                break
+            except (socket.error, relay_protocol.ProtocolError) as e:
+                print("Errore durante l'invio al server (tentativo " + str(attempt) + "): " + str(e))
+                upstream.close()
+        else:
+            return readings[start:]
+    return []
+
+
+# --- Esecuzione principale ---
+if __name__ == "__main__":
+    config_file_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CONFIG_FILE_PATH
+    try:
+        settings = load_gateway_config(config_file_path)
+    except (configparser.Error, ValueError) as e:
+        print("ERRORE CRITICO nella configurazione del gateway: " + str(e))
+        sys.exit(1)
+
+    sequence_counter = SequenceCounter(settings.sequence_state_path)
+    upstream = UpstreamConnection(settings.server_host, settings.server_port,
+                                  settings.gateway_id, settings.upstream_timeout)
+    pending_spool = PendingSpool(settings.pending_spool_path, settings.max_pending)
+    pending = pending_spool.load()  # Letture non ancora confermate dal server
+    try:
+        while True:
+            cycle_start = time.time()
+            # 1. Leggi tutti i sensori in parallelo
+            new_readings = poll_sensors(settings.sensors, settings.max_parallel, settings.sensor_timeout)
+            print("Letture riuscite: " + str(len(new_readings)) + " su " + str(len(settings.sensors)) + " sensori.")
+
+            # 2. Inoltra al server, insieme a quelle rimaste in sospeso
+            try:
+                pending.extend(sequence_counter.assign(new_readings))
+            except (IOError, OSError) as e:
+                print("ERRORE: impossibile salvare lo stato delle sequenze (" + str(e) + "). Letture del ciclo scartate.")
+            pending = pending_spool.trim(pending)
+            pending_spool.save(pending)  # Prima dell'invio: un'interruzione non perde le letture del ciclo
+            pending = forward_readings(upstream, pending, settings.batch_size)
+            if pending:
+                print(str(len(pending)) + " letture non confermate dal server, conservate per il prossimo invio.")
+            pending_spool.save(pending)
+
+            if settings.poll_interval <= 0:
+                break
+            time.sleep(max(0, settings.poll_interval - (time.time() - cycle_start)))
+    except KeyboardInterrupt:
+        print("Interruzione richiesta dall'utente.")
+    finally:
+        upstream.close()
+
+    print("Script completato.")
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Protocollo di trasmissione multiplexato tra gateway dei sensori e server.
+
+Compatibile con Python 2 (relay su Arduino Yun) e Python 3 (server).
+
+Una connessione inizia con una riga di intestazione, seguita da blocchi
+(batch) di letture. Ogni batch termina con una riga 'E <numero_letture>'
+a cui il server risponde con 'OK <numero_letture>' dopo aver registrato i dati:
+
+    RUGGERO/2 <id_gateway>
+    R <sorgente> <sequenza> <timestamp_unix> <dato>
+    R <sorgente> <sequenza> <timestamp_unix> <dato>
+    E 2
+                                            <- OK 2
+
+I nomi delle sorgenti non possono contenere spazi. Il numero di sequenza
+cresce di uno ad ogni lettura della stessa sorgente: il server scarta le
+letture con sequenza gia' vista, per cui ritrasmettere un batch non
+confermato (o un arretrato dopo un'interruzione) non produce duplicati.
+
+Versioni: la 1 non aveva il numero di sequenza nelle righe 'R'. Il server
+rifiuta le intestazioni di versioni diverse dalla propria e risponde con
+'ERR <motivo>' prima di chiudere la connessione.
+"""
+
+PROTOCOL_MAGIC = "RUGGERO/"
+PROTOCOL_VERSION = 2
+HEADER_PREFIX = PROTOCOL_MAGIC + str(PROTOCOL_VERSION)
+
+
+class ProtocolError(ValueError):
+    """Riga non conforme al protocollo."""
+    pass
+
+
+def encode_header(gateway_id):
+    return HEADER_PREFIX + " " + gateway_id + "\n"
+
+
+def decode_header(line):
+    """Restituisce l'id del gateway contenuto nella riga di intestazione."""
+    parts = line.strip().split()
+    if parts and parts[0].startswith(PROTOCOL_MAGIC) and parts[0] != HEADER_PREFIX:
+        raise ProtocolError("Versione del protocollo non supportata: '" + parts[0] + "' (richiesta " + HEADER_PREFIX +
+                            "). Aggiornare relay_protocol.py sul gateway.")
+    if len(parts) != 2 or parts[0] != HEADER_PREFIX:
+        raise ProtocolError("Intestazione non valida: '" + line.strip() + "'")
+    return parts[1]
+
+
+def encode_reading(source, seq, timestamp, data):
+    """Codifica una lettura. 'data' e' il valore letto dal sensore (senza a capo)."""
+    if not source or " " in source:
+        raise ProtocolError("Nome sorgente non valido: '" + str(source) + "'")
+    return "R " + source + " " + str(int(seq)) + " " + str(int(timestamp)) + " " + data.strip() + "\n"
+
+
+def decode_reading(line):
+    """Restituisce la tupla (sorgente, sequenza, timestamp_unix, dato) di una riga 'R'."""
+    parts = line.strip().split(" ", 4)
+    if len(parts) != 5 or parts[0] != "R":
+        raise ProtocolError("Lettura non valida: '" + line.strip() + "'")
+    try:
+        seq = int(parts[2])
+        timestamp = int(parts[3])
+    except ValueError:
+        raise ProtocolError("Sequenza o timestamp non validi: '" + line.strip() + "'")
+    return parts[1], seq, timestamp, parts[4]
+
+
+def encode_batch(readings):
+    """Codifica un batch di letture [(sorgente, sequenza, timestamp, dato)] con la riga di chiusura."""
+    lines = [encode_reading(source, seq, timestamp, data) for source, seq, timestamp, data in readings]
+    lines.append("E " + str(len(lines)) + "\n")
+    return "".join(lines)
+
+
+def decode_batch_end(line):
+    """Restituisce il numero di letture dichiarato da una riga 'E', oppure None se la riga non e' di chiusura."""
+    parts = line.strip().split()
+    if len(parts) != 2 or parts[0] != "E":
+        return None
+    try:
+        return int(parts[1])
+    except ValueError:
+        raise ProtocolError("Chiusura batch non valida: '" + line.strip() + "'")
+
+
+def encode_ack(count):
+    return "OK " + str(count) + "\n"
+
+
+def encode_error(reason):
+    return "ERR " + " ".join(reason.split()) + "\n"
+
+
+def decode_ack(line):
+    """Restituisce il numero di letture confermate dal server. Una riga 'ERR' solleva ProtocolError con il motivo."""
+    if line.startswith("ERR "):
+        raise ProtocolError("Errore dal server: " + line[len("ERR "):].strip())
+    parts = line.strip().split()
+    if len(parts) != 2 or parts[0] != "OK":
+        raise ProtocolError("Conferma non valida: '" + line.strip() + "'")
+    return int(parts[1])
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Replay / test di carico del percorso di ricezione delle misurazioni.
+
+Rilegge file 'measurements.log*' (anche quelli prodotti da genera_log_test.py)
+e ritrasmette le letture via TCP al server sulla porta 50008, con il
+protocollo dei gateway (relay_protocol.py) oppure come relay singoli
+(--legacy), a una velocita' pari a N volte il tempo reale, con piu'
+connessioni concorrenti ed eventualmente a raffiche (simulando lo
+svuotamento dell'arretrato dopo un'interruzione).
+
+Ogni esecuzione si presenta al server con id di gateway propri
+('replay-<esecuzione>-<worker>') e numera le letture da 1: il server tiene
+le sequenze per (gateway, sorgente), per cui il replay non altera quelle dei
+gateway reali. Verso un server remoto (--host) i nomi delle sorgenti hanno
+sempre un prefisso non vuoto (default 'replay-'), per non mescolare le
+righe di test a quelle dei sensori nei log.
+
+Al termine riporta throughput, latenza delle conferme (p50/p99) e, se i log
+scritti dal server sono accessibili, le letture perse o duplicate. Senza
+--host viene avviato in locale un server sostitutivo (acquaGatewayServer)
+che scrive in una directory temporanea.
+
+Esempi:
+    python3 replay_log.py logs/measurements.log.2025-04 --speedup 86400 --concurrency 8
+    python3 replay_log.py logs/measurements.log.* --burst 500:2 --retry-rate 0.1
+    python3 replay_log.py logs/measurements.log.2025-04 --clone-sources 100 --concurrency 200 --speedup 0
+    python3 replay_log.py logs/measurements.log --host 192.168.178.28 --source-prefix replay-
+"""
+
+import argparse
+import collections
+import datetime
+import logging
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+
+import acquaGatewayServer
+import relay_protocol
+from acqua import measurements_db
+from readTelnetAndSendToServer6 import UpstreamConnection
+
+DEFAULT_PORT = acquaGatewayServer.DEFAULT_PORT
+
+
+def load_readings(log_file_paths, source_prefix="", clone_sources=1):
+    """
+    Legge le misurazioni dai file di log. Restituisce [(datetime, sorgente, livello_str)] in ordine cronologico.
+    Con clone_sources > 1 ogni sorgente viene replicata come '<nome>-1' ... '<nome>-N', per simulare
+    piu' sensori di quelli presenti nei log.
+    """
+    readings = []
+    for log_file_path in log_file_paths:
+        with open(log_file_path, 'r', encoding='utf-8', errors='replace') as fo:
+            for rec in fo:
+                row = measurements_db.parse_measurement_line(rec.strip())
+                if row is None:
+                    continue
+                client, ts, _ = row
+                level_str = rec.split()[2]
+                reading_dt = datetime.datetime.strptime(ts, measurements_db.DB_DATETIME_FORMAT)
+                if clone_sources > 1:
+                    readings.extend((reading_dt, f"{source_prefix}{client}-{n}", level_str) for n in range(1, clone_sources + 1))
+                else:
+                    readings.append((reading_dt, source_prefix + client, level_str))
+    readings.sort(key=lambda reading: reading[0])
+    return readings
+
+
+def format_log_line(reading_dt, source, level_str):
+    """Riga che il server scrive in measurements.log per una lettura ricevuta da un gateway."""
+    return f"{reading_dt.strftime('%d/%m/%Y')}    {reading_dt.strftime('%H:%M')}    {level_str}    (Client: {source})"
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class ReplayStats:
+    """Contatori condivisi tra i worker."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ack_latencies = []
+        self.sent = 0
+        self.acked = 0
+        self.failed = 0
+        self.retransmitted = 0
+
+    def record_batch(self, size, latency, ok):
+        with self.lock:
+            self.sent += size
+            if ok:
+                self.acked += size
+                self.ack_latencies.append(latency)
+            else:
+                self.failed += size
+
+
+class ReplayWorker(threading.Thread):
+    """
+    Invia le letture di un sottoinsieme di sorgenti su una propria connessione.
+    Ogni sorgente e' assegnata a un solo worker, per cui le sue sequenze
+    arrivano al server in ordine.
+    """
+
+    def __init__(self, worker_id, readings, args, stats, schedule_origin, run_id):
+        super().__init__(name=f"replay-{worker_id}", daemon=True)
+        self.worker_id = worker_id
+        self.gateway_id = f"replay-{run_id}-{worker_id}"
+        self.readings = readings
+        self.args = args
+        self.stats = stats
+        self.schedule_origin = schedule_origin  # (istante_reale_iniziale, timestamp_log_iniziale)
+        self.last_seq = {}  # Sequenze da 1 per sorgente, nello spazio del gateway id di questa esecuzione
+
+    def due_time(self, reading_dt):
+        if self.args.speedup <= 0 or self.args.burst:
+            return 0
+        wall_start, log_start = self.schedule_origin
+        return wall_start + (reading_dt - log_start).total_seconds() / self.args.speedup
+
+    def next_batches(self):
+        """Genera i batch rispettando il ritmo (tempo reale accelerato) o lo schema a raffiche."""
+        batch_size = self.args.batch_size
+        burst_size, burst_pause = self.args.burst if self.args.burst else (0, 0)
+        sent_in_burst = 0
+        index = 0
+        while index < len(self.readings):
+            delay = self.due_time(self.readings[index][0]) - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            now = time.time()
+            batch = []
+            while index < len(self.readings) and len(batch) < batch_size and self.due_time(self.readings[index][0]) <= now:
+                batch.append(self.readings[index])
+                index += 1
+            yield batch
+            if burst_size:
+                sent_in_burst += len(batch)
+                if sent_in_burst >= burst_size:
+                    time.sleep(burst_pause)
+                    sent_in_burst = 0
+
+    def run(self):
+        if self.args.legacy:
+            self.run_legacy()
+        else:
+            self.run_gateway()
+
+    def run_gateway(self):
+        upstream = UpstreamConnection(self.args.host, self.args.port, self.gateway_id, self.args.timeout)
+        try:
+            for batch in self.next_batches():
+                numbered = []
+                for reading_dt, source, level_str in batch:
+                    seq = self.last_seq.get(source, 0) + 1
+                    self.last_seq[source] = seq
+                    numbered.append((source, seq, int(time.mktime(reading_dt.timetuple())), level_str))
+                self.send_with_retry(upstream, numbered)
+                if self.args.retry_rate and random.random() < self.args.retry_rate:
+                    # Ritrasmissione volontaria, come dopo un timeout sulla conferma
+                    with self.stats.lock:
+                        self.stats.retransmitted += len(numbered)
+                    self.send_with_retry(upstream, numbered, count_in_stats=False)
+        finally:
+            upstream.close()
+
+    def send_with_retry(self, upstream, numbered, count_in_stats=True):
+        for attempt in (1, 2):
+            start = time.perf_counter()
+            try:
+                upstream.send_batch(numbered)
+                if count_in_stats:
+                    self.stats.record_batch(len(numbered), time.perf_counter() - start, True)
+                return
+            except (socket.error, relay_protocol.ProtocolError) as e:
+                print(f"[worker {self.worker_id}] errore di invio (tentativo {attempt}): {e}")
+                upstream.close()
+        if count_in_stats:
+            self.stats.record_batch(len(numbered), 0, False)
+
+    def run_legacy(self):
+        """Un valore per connessione, con attesa dell'eco (come readTelnetAndSendToServer5.py)."""
+        for batch in self.next_batches():
+            for _, _, level_str in batch:
+                start = time.perf_counter()
+                ok = False
+                try:
+                    with socket.create_connection((self.args.host, self.args.port), self.args.timeout) as sock:
+                        sock.settimeout(self.args.timeout)
+                        sock.sendall(level_str.encode('utf-8'))
+                        ok = bool(sock.recv(1024))
+                except socket.error as e:
+                    print(f"[worker {self.worker_id}] errore di invio: {e}")
+                self.stats.record_batch(1, time.perf_counter() - start, ok)
+
+
+def read_logged_lines(log_directory):
+    """Righe presenti in measurements.log* della directory indicata."""
+    lines = []
+    for log_file_name in sorted(os.listdir(log_directory)):
+        if measurements_db.MEASUREMENT_LOG_NAME_RE.match(log_file_name):
+            with open(os.path.join(log_directory, log_file_name), 'r', encoding='utf-8', errors='replace') as fo:
+                lines.extend(line.rstrip('\n') for line in fo if line.strip())
+    return lines
+
+
+def start_standin_server(log_directory):
+    """Avvia in background un acquaGatewayServer su una porta libera di localhost."""
+    logging.getLogger(acquaGatewayServer.__name__).setLevel(logging.WARNING)
+    writer = acquaGatewayServer.MeasurementLogWriter(log_directory)
+    window = acquaGatewayServer.SequenceWindow(os.path.join(log_directory, 'sequence_state.json'))
+    server = acquaGatewayServer.MeasurementServer(('127.0.0.1', 0), writer, window)
+    threading.Thread(target=server.serve_forever, name="standin-server", daemon=True).start()
+    return server, writer
+
+
+def parse_burst(value):
+    size_str, _, pause_str = value.partition(':')
+    try:
+        size, pause = int(size_str), float(pause_str or 0)
+    except ValueError:
+        raise argparse.ArgumentTypeError("formato atteso DIMENSIONE:PAUSA_SECONDI, es. 500:2")
+    if size <= 0 or pause < 0:
+        raise argparse.ArgumentTypeError("dimensione positiva e pausa non negativa richieste")
+    return size, pause
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Replay dei log delle misurazioni verso il server di ricezione.")
+    arg_parser.add_argument("log_files", nargs="+", help="File measurements.log* da ritrasmettere")
+    arg_parser.add_argument("--host", help="Server di destinazione (default: server sostitutivo locale)")
+    arg_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    arg_parser.add_argument("--speedup", type=float, default=3600, help="Fattore rispetto al tempo reale (0 = massima velocita')")
+    arg_parser.add_argument("--concurrency", type=int, default=4, help="Connessioni concorrenti")
+    arg_parser.add_argument("--clone-sources", type=int, default=1, metavar="N",
+                            help="Replica ogni sorgente come <nome>-1..<nome>-N (piu' sensori e connessioni di quelli presenti nei log)")
+    arg_parser.add_argument("--batch-size", type=int, default=20, help="Letture per batch (protocollo gateway)")
+    arg_parser.add_argument("--burst", type=parse_burst, help="Invio a raffiche DIMENSIONE:PAUSA_SECONDI per connessione, ignorando i timestamp")
+    arg_parser.add_argument("--retry-rate", type=float, default=0.0, help="Frazione di batch ritrasmessi volontariamente (verifica deduplicazione)")
+    arg_parser.add_argument("--legacy", action="store_true", help="Invia come relay singoli (una connessione per lettura, eco come conferma)")
+    arg_parser.add_argument("--source-prefix", help="Prefisso dei nomi delle sorgenti, per non mescolarle a quelle reali "
+                                                    "(default: 'replay-' con --host, nessuno con il server sostitutivo locale)")
+    arg_parser.add_argument("--timeout", type=float, default=10)
+    arg_parser.add_argument("--verify-log-dir", help="Directory dei log del server remoto, per contare letture perse o duplicate")
+    args = arg_parser.parse_args()
+    args.batch_size = max(1, args.batch_size)
+    args.clone_sources = max(1, args.clone_sources)
+    if args.source_prefix is None:
+        args.source_prefix = "replay-" if args.host else ""
+    elif args.host and not args.source_prefix:
+        arg_parser.error("con --host serve un --source-prefix non vuoto: le righe del replay finirebbero nei log con i nomi dei sensori reali")
+
+    readings = load_readings(args.log_files, args.source_prefix, args.clone_sources)
+    if not readings:
+        print("Nessuna misurazione valida trovata nei file indicati.")
+        return 1
+
+    standin = None
+    verify_log_dir = args.verify_log_dir
+    if not args.host:
+        verify_log_dir = tempfile.mkdtemp(prefix="replay_standin_")
+        standin = start_standin_server(verify_log_dir)
+        args.host, args.port = standin[0].server_address[0], standin[0].server_address[1]
+        print(f"Server sostitutivo locale su {args.host}:{args.port}, log in {verify_log_dir}")
+    logged_before = collections.Counter(read_logged_lines(verify_log_dir)) if verify_log_dir else collections.Counter()
+
+    # Ogni sorgente a un solo worker, per mantenerne l'ordine
+    sources = sorted({source for _, source, _ in readings})
+    worker_count = max(1, min(args.concurrency, len(sources)))
+    if worker_count < args.concurrency:
+        print(f"Attenzione: richieste {args.concurrency} connessioni ma le sorgenti sono solo {len(sources)}: "
+              f"se ne useranno {worker_count}. Aumentare --clone-sources per piu' connessioni.")
+    worker_of_source = {source: i % worker_count for i, source in enumerate(sources)}
+    readings_by_worker = collections.defaultdict(list)
+    for reading in readings:
+        readings_by_worker[worker_of_source[reading[1]]].append(reading)
+
+    span = readings[-1][0] - readings[0][0]
+    print(f"Replay di {len(readings)} letture da {len(sources)} sorgenti ({span} di storico) "
+          f"con {worker_count} connessioni, speedup {args.speedup:g}x" + (f", raffiche {args.burst[0]}:{args.burst[1]:g}s" if args.burst else ""))
+
+    stats = ReplayStats()
+    wall_start = time.time()
+    run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{random.randrange(16 ** 4):04x}"  # Diverso anche per esecuzioni nello stesso secondo
+    workers = [ReplayWorker(i, readings_by_worker[i], args, stats, (wall_start, readings[0][0]), run_id) for i in range(worker_count)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - wall_start
+
+    latencies_ms = sorted(latency * 1000 for latency in stats.ack_latencies)
+    print("\n--- Risultati ---")
+    print(f"Durata: {elapsed:.2f} s")
+    print(f"Letture inviate: {stats.sent}, confermate: {stats.acked}, fallite: {stats.failed}, ritrasmesse volontariamente: {stats.retransmitted}")
+    print(f"Throughput: {stats.acked / elapsed if elapsed > 0 else 0:.1f} letture/s")
+    print(f"Latenza conferme ({len(latencies_ms)} {'connessioni' if args.legacy else 'batch'}): "
+          f"p50 {percentile(latencies_ms, 0.50):.2f} ms, p99 {percentile(latencies_ms, 0.99):.2f} ms, max {latencies_ms[-1] if latencies_ms else float('nan'):.2f} ms")
+
+    if standin:
+        standin[0].shutdown()
+        standin[0].server_close()
+        standin[1].close()
+    if verify_log_dir:
+        logged_lines = collections.Counter(read_logged_lines(verify_log_dir)) - logged_before
+        if args.legacy:
+            # Il server registra i relay singoli con il proprio orario: si confrontano solo i conteggi
+            logged_new = sum(logged_lines.values())
+            print(f"Righe registrate: {logged_new} (attese {stats.acked}): "
+                  f"perse {max(0, stats.acked - logged_new)}, in eccesso {max(0, logged_new - stats.acked)}")
+        else:
+            expected = collections.Counter(format_log_line(*reading) for reading in readings)
+            logged = collections.Counter({line: count for line, count in logged_lines.items() if line in expected})
+            dropped = sum((expected - logged).values())
+            duplicated = sum((logged - expected).values())
+            print(f"Righe registrate: {sum(logged.values())} (attese {len(readings)}): perse {dropped}, duplicate {duplicated}")
+        return 0
+    print("Verifica di perdite/duplicati saltata: indicare --verify-log-dir per un server remoto.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())